@@ -64,10 +64,19 @@ Processing.initialize()
 print("Processing framework OK")
 import geopandas as gpd
 from shapely.geometry import shape
+from utils.PV_BuildCache import BuildManifest, shapefile_parts
 
 
 ### VECTOR DATA #####
 
+# OSM fclass values kept by the land-use / railway-station extraction
+LANDUSE_FCLASS = ('farmland', 'farmyard', 'grass', 'heath', 'meadow', 'scrub')
+RAILWAY_FCLASS = ('railway_station', 'railway_halt')
+
+def fclass_expression(classes) -> str:
+    """QGIS expression keeping the features whose fclass is one of classes."""
+    return '"fclass" IN (' + ', '.join(f"'{c}'" for c in classes) + ')'
+
 # ========================== Fix Geometries Class =======================================
 
 class Dataextraction_fixgeometry(QgsProcessingAlgorithm):
@@ -229,7 +238,7 @@ class Dataextraction_landuse(QgsProcessingAlgorithm):
 
         # Extract by expression
         alg_params = {
-            'EXPRESSION': '"fclass" IN (\'farmland\', \'farmyard\', \'grass\', \'heath\', \'meadow\', \'scrub\')',
+            'EXPRESSION': fclass_expression(LANDUSE_FCLASS),
             'INPUT': outputs['Clip']['OUTPUT'],
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
         }
@@ -357,7 +366,7 @@ class Dataextraction_railwaystation(QgsProcessingAlgorithm):
 
         # Extract by expression
         alg_params = {
-            'EXPRESSION': '"fclass" IN (\'railway_station\', \'railway_halt\')',
+            'EXPRESSION': fclass_expression(RAILWAY_FCLASS),
             'INPUT': outputs['Clip']['OUTPUT'],
             'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
         }
@@ -638,6 +647,126 @@ def runner_Dataextraction_roadvertices(boundary_path, road_path, region_name ,fi
     result = alg.processAlgorithm(params, context, feedback)
     print(f"Success: Saved to {filter_path}")
 
+# ========================== RoadLines Extraction Class ====================================
+# Same clip as Dataextraction_roadvertices but keeps the road linestrings:
+# no native:extractvertices, the box -> road distance is measured to the line itself.
+
+class Dataextraction_roadlines(QgsProcessingAlgorithm):
+    
+    P_boundary_map = 'boundary_map'
+    P_road_vector = 'road_vector'
+    P_region_name = 'region_name'
+    P_roadLines_filter = 'roadLines_filter'
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterVectorLayer(self.P_boundary_map, 'boundary_map', types=[QgsProcessing.TypeVectorAnyGeometry], defaultValue=None))
+        self.addParameter(QgsProcessingParameterString(self.P_region_name, 'region_name', multiLine=False, defaultValue=''))
+        self.addParameter(QgsProcessingParameterVectorLayer(self.P_road_vector, 'road_vector', types=[QgsProcessing.TypeVectorAnyGeometry], defaultValue=None))
+        self.addParameter(QgsProcessingParameterFeatureSink(self.P_roadLines_filter, 'roadLines_filter', type=QgsProcessing.TypeVectorAnyGeometry, createByDefault=True, supportsAppend=True, defaultValue=None))
+
+    def processAlgorithm(self, parameters, context, model_feedback):
+        feedback = QgsProcessingMultiStepFeedback(6, model_feedback)
+        results = {}
+        outputs = {}
+
+        # 0. Create spatial index_road vector
+        alg_params = {
+            'INPUT': parameters[self.P_road_vector]
+        }
+        outputs['CreateSpatialIndex_roadVector'] = processing.run('native:createspatialindex', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+
+        feedback.setCurrentStep(1)
+        if feedback.isCanceled():
+            return {}
+
+        # 1. Fix geometries
+        alg_params = {
+            'INPUT': parameters[self.P_boundary_map],
+            'METHOD': 0,  
+            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+        }
+        outputs['FixGeometries'] = processing.run('native:fixgeometries', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+
+        feedback.setCurrentStep(2)
+        if feedback.isCanceled():
+            return {}
+
+        # 2. Clip
+        alg_params = {
+            'INPUT': parameters[self.P_road_vector],
+            'OVERLAY': outputs['FixGeometries']['OUTPUT'],
+            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+        }
+        outputs['Clip'] = processing.run('native:clip', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+
+        feedback.setCurrentStep(3)
+        if feedback.isCanceled():
+            return {}
+
+        # 3. Drop field(s) road layer column
+        alg_params = {
+            'COLUMN': ['ref', 'oneway', 'maxspeed', 'layer', 'bridge', 'tunnel'],
+            'INPUT': outputs['Clip']['OUTPUT'],
+            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+        }
+        outputs['DropFieldsRoadLayerColumn'] = processing.run('native:deletecolumn', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+
+        feedback.setCurrentStep(4)
+        if feedback.isCanceled():
+            return {}
+
+        # 4. Field calculator (Region Name)
+        region_val = parameters[self.P_region_name]
+        alg_params = {
+            'FIELD_LENGTH': 100,
+            'FIELD_NAME': 'region_name',
+            'FIELD_PRECISION': 0,
+            'FIELD_TYPE': 2, # 2 = String
+            'FORMULA': f"'{region_val}'",
+            'INPUT': outputs['DropFieldsRoadLayerColumn']['OUTPUT'],
+            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
+        }
+        outputs['FieldCalculator'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+
+        feedback.setCurrentStep(5)
+        if feedback.isCanceled():
+            return {}
+
+        # 5. Rename field
+        alg_params = {
+            'FIELD': 'osm_id',
+            'INPUT': outputs['FieldCalculator']['OUTPUT'],
+            'NEW_NAME': 'road_id',
+            'OUTPUT': parameters[self.P_roadLines_filter]
+        }
+        outputs['RenameField'] = processing.run('native:renametablefield', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
+
+        results[self.P_roadLines_filter] = outputs['RenameField']['OUTPUT']
+        return results
+
+    def name(self): return 'dataExtraction_roadLines'
+    def displayName(self): return 'dataExtraction_roadLines'
+    def group(self): return ''
+    def groupId(self): return ''
+    def createInstance(self): return Dataextraction_roadlines()
+
+def runner_Dataextraction_roadlines(boundary_path, road_path, region_name ,filter_path):
+    params = {
+        Dataextraction_roadlines.P_boundary_map: boundary_path,
+        Dataextraction_roadlines.P_road_vector: road_path,
+        Dataextraction_roadlines.P_region_name: region_name,
+        Dataextraction_roadlines.P_roadLines_filter: filter_path,
+    }
+    
+    context = QgsProcessingContext()
+    feedback = QgsProcessingFeedback()
+    context.setProject(QgsProject.instance())
+    
+    alg = Dataextraction_roadlines()
+    alg.initAlgorithm()
+    result = alg.processAlgorithm(params, context, feedback)
+    print(f"Success: Saved to {filter_path}")
+
 # ========================== Runner and Pipeline ==============================================
 
 class Dataextraction_clipvector(QgsProcessingAlgorithm):
@@ -818,7 +947,7 @@ def run_pipeline(args):
     fixgeometries_out_1 = extraction_path / 'extraction' /region /  f'fixGeometries_{region}_1.geojson'
     landuse_out = extraction_path / 'extraction' /region /  f'landUse_filter_{region}.geojson'
     railway_out = extraction_path / 'extraction' /region / f'railwayStation_filter_{region}.geojson'
-    road_out = extraction_path / 'extraction' /region / f'roadVertices_filter_{region}.geojson'
+    road_out = extraction_path / 'extraction' /region / f'roadLines_filter_{region}.geojson'
     centroid_dso_out = extraction_path / 'extraction' /region /  f'centroid_dso_{region}.geojson'
     centroid_solar_out = extraction_path / 'extraction' /region /  f'centroid_solar_{region}.geojson'
     
@@ -826,6 +955,9 @@ def run_pipeline(args):
     dni_out = extraction_path / 'extraction' /region / f'dni_clip_{region}.tif'
     temp_out = extraction_path / 'extraction' /region / f'temp_clip_{region}.tif'
     pvout_out = extraction_path / 'extraction' /region / f'pvout_clip_{region}.tif'
+    # step fingerprints (input hashes, parameters, code); file hashes are memoised in cache/digests/
+    manifest = BuildManifest(extraction_path / 'extraction' / region / f'build_manifest_{region}.json',
+                             digest_dir=extraction_path / 'cache')
     
     # 4. Step Validation Logic
     # Convert list of steps to set for O(1) lookup; default to steps 0-2
@@ -842,20 +974,22 @@ def run_pipeline(args):
     else:
         steps_to_run = set(map(str, range(0, 10)))  # default: run all steps
 
-    def should_run(output_path: Path, step_id: str, input_file: Path):
+    def should_run(step_id: str, outputs, inputs, params=None, code=()):
+        """Selected step whose first input exists and whose inputs, params or code changed since its last run."""
         if step_id not in steps_to_run: 
             return False
-        if not input_file.exists():
-            print(f"Error: Input file for Step {step_id} missing at {input_file}")
+        if not Path(inputs[0]).exists():
+            print(f"Error: Input file for Step {step_id} missing at {inputs[0]}")
             return False
-        return args.force or not output_path.exists()
+        return manifest.is_stale(step_id, outputs, inputs, params, code, force=args.force)
 
     # --- EXECUTION STEPS ---
     
     ### runner vector 
     
     # Step 0: Fix geometries
-    if should_run(fixgeometries_out, "0", boundary_map_path):
+    if should_run("0", [fixgeometries_out], [boundary_map_path],
+                  code=(runner_Dataextraction_fixgeometry, Dataextraction_fixgeometry, is_layer_valid)):
         fixgeometries_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"Step 0: Fixing geometries boundary map → {fixgeometries_out}")
         runner_Dataextraction_fixgeometry(str(boundary_map_path), str(fixgeometries_out))
@@ -872,61 +1006,78 @@ def run_pipeline(args):
             fixgeometries_out_1.rename(fixgeometries_out)
         else:
             pass
+        manifest.record("0")
         
     # Step 1: Landuse
-    if should_run(landuse_out, "1", landuse_vector_path):
+    if should_run("1", [landuse_out], [*shapefile_parts(landuse_vector_path), boundary_map_path],
+                  {'region': region, 'fclass': LANDUSE_FCLASS},
+                  (runner_Dataextraction_landuse, Dataextraction_landuse, fclass_expression)):
         landuse_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"Step 1: Extracting Landuse → {landuse_out}")
         runner_Dataextraction_landuse(str(boundary_map_path), str(landuse_vector_path), region, str(landuse_out))
+        manifest.record("1")
 
     # Step 2: Railway
-    if should_run(railway_out, "2", railway_vector_path):
+    if should_run("2", [railway_out], [*shapefile_parts(railway_vector_path), boundary_map_path],
+                  {'region': region, 'fclass': RAILWAY_FCLASS},
+                  (runner_Dataextraction_railwaystation, Dataextraction_railwaystation, fclass_expression)):
         railway_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"Step 2: Extracting Railway → {railway_out}")
         runner_Dataextraction_railwaystation(str(boundary_map_path), str(railway_vector_path), region, str(railway_out))
+        manifest.record("2")
 
-    # Step 3: Road Vertices
-    if should_run(road_out, "3", road_vector_path):
+    # Step 3: Road Lines (clipped linestrings, no vertex explosion)
+    if should_run("3", [road_out], [*shapefile_parts(road_vector_path), boundary_map_path], {'region': region},
+                  (runner_Dataextraction_roadlines, Dataextraction_roadlines)):
         road_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 3: Extracting Road Vertices → {road_out}")
-        runner_Dataextraction_roadvertices(str(boundary_map_path), str(road_vector_path), region, str(road_out))
+        print(f"Step 3: Extracting Road Lines → {road_out}")
+        runner_Dataextraction_roadlines(str(boundary_map_path), str(road_vector_path), region, str(road_out))
+        manifest.record("3")
         
     # Step 4: Get the DSO
     
-    if should_run(output_path=centroid_dso_out, step_id="4", input_file= dso_path):
+    clip_vector_code = (runner_Dataextraction_clipvector, Dataextraction_clipvector)
+    if should_run("4", [centroid_dso_out], [dso_path, boundary_map_path], {'region': region}, clip_vector_code):
         centroid_dso_out.parent.mkdir(parents=True, exist_ok=True)
         print("Step 4: Extracting DSO centroid →", centroid_dso_out)
         runner_Dataextraction_clipvector(boundary_path=str(boundary_map_path), input_vector_path=str(dso_path), region_name =region, vector_clip_path=str(centroid_dso_out))
+        manifest.record("4")
         
     # Step 5: Get the RES centroid
-    if should_run(output_path=centroid_solar_out, step_id="5", input_file= solar_path):
+    if should_run("5", [centroid_solar_out], [solar_path, boundary_map_path], {'region': region}, clip_vector_code):
         centroid_solar_out.parent.mkdir(parents=True, exist_ok=True)
         print("Step 5: Extracting Solar centroid →", centroid_solar_out)
         runner_Dataextraction_clipvector(boundary_path=str(boundary_map_path), input_vector_path=str(solar_path), region_name =region, vector_clip_path=str(centroid_solar_out))
+        manifest.record("5")
         
     # Step 6: DEM Raster
-    if should_run(dem_out, "6", dem_path):
+    clip_raster_code = (runner_Dataextraction_clipraster, Dataextraction_clipraster)
+    if should_run("6", [dem_out], [dem_path, fixgeometries_out], code=clip_raster_code):
         dem_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"step 6: DEM raster clip")
         runner_Dataextraction_clipraster(str(fixgeometries_out), str(dem_path), str(dem_out))
+        manifest.record("6")
     
     # Step 7: DNI Raster
-    if should_run(dni_out, "7", dni_path):
+    if should_run("7", [dni_out], [dni_path, fixgeometries_out], code=clip_raster_code):
         dni_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"step 7: DNI raster clip")
         runner_Dataextraction_clipraster(str(fixgeometries_out), str(dni_path), str(dni_out))
+        manifest.record("7")
     
     # Step 8: Temp Raster
-    if should_run(temp_out, "8", temp_path):
+    if should_run("8", [temp_out], [temp_path, fixgeometries_out], code=clip_raster_code):
         temp_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"step 8: TEMP raster clip")
         runner_Dataextraction_clipraster(str(fixgeometries_out), str(temp_path), str(temp_out))
+        manifest.record("8")
     
     # Step 9: PVOUT Raster
-    if should_run(pvout_out, "9", pvout_path):
+    if should_run("9", [pvout_out], [pvout_path, fixgeometries_out], code=clip_raster_code):
         pvout_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"step 9: PVOUT raster clip")
         runner_Dataextraction_clipraster(str(fixgeometries_out), str(pvout_path), str(pvout_out))
+        manifest.record("9")
         
 
     print("Pipeline processing finished.")
@@ -936,7 +1087,8 @@ if __name__ == "__main__":
     parser.add_argument("--steps", nargs="+", help='Steps to run (e.g., 0 1 or "all")')
     parser.add_argument("--input-path", type=str, required=True, help="Root input directory")
     parser.add_argument("--region-name", type=str, required=True, help="Name of the region (e.g., dolnoslaskie)")
-    parser.add_argument("--force", action="store_true", help="Overwrite existing output files")
+    parser.add_argument("--force", action="store_true",
+                        help="Rerun the selected steps even when their inputs, parameters and code are unchanged")
     #parser.add_argument("--extraction-path", type=str, required=True, help="Root output directory")
     
     # 2. Programmatic execution for multiple regions
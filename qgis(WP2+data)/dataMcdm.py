@@ -1,23 +1,31 @@
 import pandas as pd
-import geopandas as gpd
-from functools import reduce
 from pathlib import Path
+
+from utils.PV_ArtefactIO import (find_artefact, read_artefact, write_artefact, artefact_path, box_ids, aligned_columns,
+                                 ARTEFACT_FORMATS, DEFAULT_FORMAT)
 import argparse
 
 def final_score(extraction_path, final_score_out, region):
     """
-    Merges all spatial score layers for a specific region into one GeoJSON.
+    Merges all score tables for a specific region into one narrow table
+    (box_id + scores, no geometry; format from the suffix of final_score_out).
+    The grid geometry is joined once, when the MCDM result is exported.
     """
     base_path = Path(extraction_path) / 'score' / region
     
-    # 1. Initialize with main grid geometry
-    grid_path = base_path / f'grid_box_{region}.geojson'
-    if not grid_path.exists():
-        raise FileNotFoundError(f"Base grid not found at {grid_path}")
+    # 1. Initialize with the box ids of the main grid
+    grid_path = find_artefact(base_path, f'grid_box_{region}')
+    if grid_path is None:
+        raise FileNotFoundError(f"Base grid not found at {base_path / f'grid_box_{region}'}.*")
         
-    grid_box = gpd.read_file(grid_path)
-    grid_box['box_id'] = grid_box['box_id'].astype(str) # Ensure string for merging
-    processed_dfs = [grid_box]
+    # Integer box_ids of the grid are the shared index; every score column is
+    # placed into a preallocated array by position instead of merged
+    grid_ids = box_ids(read_artefact(grid_path, columns=['box_id'])['box_id'])
+    index = pd.Index(grid_ids)
+    columns = {}
+
+    def place(df, mapping):
+        columns.update(aligned_columns(index, df['box_id'], {new: df[old].to_numpy() for old, new in mapping.items()}))
 
     # 2. Configuration: {file_suffix: (old_column_name, new_column_name)}
     # Standard layers (box2...)
@@ -41,44 +49,58 @@ def final_score(extraction_path, final_score_out, region):
         for suffix, (old_col, new_col) in layers_dict.items():
             f_path = base_path / f'score_{suffix}_{region}.geojson'
             if f_path.exists():
-                df = gpd.read_file(f_path)
-                df['box_id'] = df['box_id'].astype(str)
                 # Select only necessary columns
-                df = df[['box_id', old_col]].rename(columns={old_col: new_col})
-                processed_dfs.append(df)
+                place(read_artefact(f_path, columns=['box_id', old_col]), {old_col: new_col})
             else:
                 print(f"Warning: File missing -> {f_path.name}")
 
-    load_and_append(standard_layers)
-    load_and_append(zonal_layers)
-
-    # 4. Handle Land Ratio (Requires aggregation)
+    # Proximity scores (dso/solar/station/road) come from one compact table;
+    # fall back to the legacy per-layer score_box2* files for older runs
+    proximity_path = find_artefact(base_path, f'score_proximity_{region}')
+    if proximity_path is not None:
+        proximity_df = read_artefact(proximity_path)
+        place(proximity_df, {c: c for c in proximity_df.columns if c.endswith('_score')})
+    else:
+        load_and_append(standard_layers)
+
+    # Zonal scores (dni/pvout/temp/dem) come from one table as well;
+    # fall back to the legacy per-raster score_{name} files for older runs
+    zonal_path = find_artefact(base_path, f'score_zonal_{region}')
+    if zonal_path is not None:
+        zonal_df = read_artefact(zonal_path)
+        place(zonal_df, {f'{name}_mean': new_col for name, (_, new_col) in zonal_layers.items()
+                         if f'{name}_mean' in zonal_df.columns})
+    else:
+        load_and_append(zonal_layers)
+
+    # 4. Land ratio: one row per box (box_id, land_score, fclass); older runs
+    # wrote one row per box x land-use fragment, which still needs the aggregation
+    land_table_path = next((p for p in (base_path / f'score_landRatio_{region}.parquet',
+                                        base_path / f'score_landRatio_{region}.csv') if p.exists()), None)
     land_path = base_path / f'score_landRatio_{region}.geojson'
-    if land_path.exists():
-        land_df = gpd.read_file(land_path)
-        land_df['box_id'] = land_df['box_id'].astype(str)
+    if land_table_path is not None:
+        land_df = read_artefact(land_table_path, columns=['box_id', 'land_score', 'fclass'])
+        place(land_df, {'land_score': 'land_score', 'fclass': 'fclass'})
+    elif land_path.exists():
+        land_df = read_artefact(land_path, columns=['box_id', 'ratio', 'fclass'])
         land_agg = land_df.groupby('box_id', as_index=False).agg({
             'ratio': 'sum',
             'fclass': lambda x: x.value_counts().index[0]
-        }).rename(columns={'ratio': 'land_score'})
-        processed_dfs.append(land_agg)
-
-    # 5. Execute Sequential Merge
-    df_merged = reduce(lambda left, right: pd.merge(left, right, on='box_id', how='left'), processed_dfs)
+        })
+        place(land_agg, {'ratio': 'land_score', 'fclass': 'fclass'})
 
-    # 6. Final Column Ordering
+    # 5. Final Column Ordering
     cols_order = [
         'box_id', 'dni_score', 'pvout_score', 'temp_score', 'dem_score',
         'dso_score', 'solar_score', 'station_score', 'road_score', 
-        'land_score', 'fclass', 'area', 'perimeter', 'region_name', 'geometry'
+        'land_score', 'fclass'
     ]
     
-    # Keep only columns that exist in the dataframe
-    final_cols = [c for c in cols_order if c in df_merged.columns]
-    final_df = df_merged[final_cols].copy()
+    # Keep only columns that were found, built in one go from the aligned arrays
+    final_df = pd.DataFrame({'box_id': grid_ids, **{c: columns[c] for c in cols_order if c in columns}})
 
-    # 7. Save to GeoJSON
-    final_df.to_file(final_score_out, driver='GeoJSON')
+    # 6. Save (GeoParquet by default, GeoJSON for a .geojson path)
+    write_artefact(final_df, final_score_out)
     print(f"Done! Final file saved: {final_score_out}")
 
 
@@ -91,7 +113,8 @@ def run_pipeline(args):
     region = args.region_name
     
     # 2. output path 
-    final_score_out = extraction_path / 'score' / region / f'final_score_{region}.geojson'
+    final_score_out = artefact_path(extraction_path / 'score' / region, f'final_score_{region}', args.artefact_format,
+                                    table=True)
     
     print(f'================= creating final score for {region} =====================')
     final_score(extraction_path, final_score_out, region)
@@ -101,6 +124,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Data Extraction Pipeline")
     parser.add_argument("--input-path", type=str, required=True, help="Root input directory")
     parser.add_argument("--region-name", type=str, required=True, help="Name of the region (e.g., dolnoslaskie)")
+    parser.add_argument("--artefact-format", choices=ARTEFACT_FORMATS, default=DEFAULT_FORMAT,
+                        help=f"Format of the final score (default: {DEFAULT_FORMAT})")
     
     
     regions_list = [
@@ -1,538 +1,50 @@
 import os
-import sys
 import pandas as pd
 import geopandas as gpd
 import argparse
 from pathlib import Path
-import tempfile
-import fiona
-from functools import reduce
 import numpy as np
-from pymcdm.methods import TOPSIS
 
 # from backend.notebook.src.runner import df_box
 
-# Point Shapely to GEOS inside the QGIS app bundle (you found this path)
-os.environ["SHAPELY_LIBRARY_PATH"] = "/Applications/QGIS-LTR.app/Contents/MacOS/lib/libgeos_c.dylib"
-# Point PROJ and GDAL data to QGIS bundle
-os.environ["PROJ_LIB"] = "/Applications/QGIS-LTR.app/Contents/Resources/proj"
-os.environ["GDAL_DATA"] = "/Applications/QGIS-LTR.app/Contents/Resources/gdal"
-# Help macOS dynamic loader find QGIS libraries
-os.environ["DYLD_FALLBACK_LIBRARY_PATH"] = "/Applications/QGIS-LTR.app/Contents/MacOS/lib:" + os.environ.get(
-    "DYLD_FALLBACK_LIBRARY_PATH", "")
-# Add QGIS Python paths (keep these before importing QGIS/geopandas)
-PYTHON_PATH = "/Applications/QGIS-LTR.app/Contents/Resources/python"
-PLUGIN_PATH = "/Applications/QGIS-LTR.app/Contents/Resources/python/plugins"
-SITE_PACKAGES = "/Applications/QGIS-LTR.app/Contents/MacOS/lib/python3.9/site-packages"
-sys.path[:0] = [PYTHON_PATH, PLUGIN_PATH, SITE_PACKAGES]  # prepend to avoid accidental shadowing
-# --------------------------------------------------------------------------------
-# --- QGIS paths (macOS QGIS-LTR) ---
-QGIS_PATH = "/Applications/QGIS-LTR.app/Contents/MacOS"
-PYTHON_PATH = "/Applications/QGIS-LTR.app/Contents/Resources/python"
-PLUGIN_PATH = "/Applications/QGIS-LTR.app/Contents/Resources/python/plugins"
-SITE_PACKAGES = "/Applications/QGIS-LTR.app/Contents/MacOS/lib/python3.9/site-packages"
-# Add QGIS Python paths
-sys.path.extend([PYTHON_PATH, PLUGIN_PATH, SITE_PACKAGES])
-
-# # Environment variables
-# os.environ["QGIS_PREFIX_PATH"] = QGIS_PATH
-# os.environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = "/Applications/QGIS-LTR.app/Contents/PlugIns/platforms"
-# os.environ["GDAL_DATA"] = "/Applications/QGIS-LTR.app/Contents/Resources/gdal"
-# os.environ["PROJ_LIB"] = "/Applications/QGIS-LTR.app/Contents/Resources/proj"
-
-# --- Import QGIS ---
-from qgis.core import (
-    QgsApplication, QgsVectorLayer, Qgis,
-    QgsProcessing, QgsProcessingAlgorithm, QgsProcessingMultiStepFeedback,
-    QgsProcessingParameterVectorLayer, QgsProcessingParameterFeatureSink,
-    QgsProcessingParameterCrs, QgsProcessingParameterNumber,
-    QgsProcessingContext, QgsProcessingFeedback,
-    QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject,
-    QgsProcessingParameterRasterLayer,QgsProcessingParameterString,QgsExpression,
-    QgsProcessingParameterRasterDestination, QgsProcessingParameterRasterLayer)
-
-# Initialize QGIS (headless)
-QgsApplication.setPrefixPath(QGIS_PATH, True)
-qgs = QgsApplication([], False)
-qgs.initQgis()
-print("QGIS version:", Qgis.QGIS_VERSION)
-
-# Initialize processing framework
-import processing
-from processing.core.Processing import Processing
-import json
-
-Processing.initialize()
-print("Processing framework OK")
-import geopandas as gpd
-from shapely.geometry import shape
-from utils.PV_BoxCentroidScore import runner_PV_Box2Dso, runner_PV_Box2Plant , runner_PV_Box2Railway, runner_PV_Box2Road
-from utils.mcdm_score import mcdm_score_calculation
+from utils.PV_BoxCentroidScore import runner_PV_Box2Feature, PROXIMITY_LAYERS, PROJECTED_CRS
+from utils.PV_ZonalEngine import runner_PvZonalStatisticMulti
+from utils.PV_LandUseEngine import runner_PvLandUseRatio
+from utils.PV_GridBuilder import (runner_PvCreateGrid, runner_PvCreateHexGrid, runner_PvCreateCentroid,
+                                  hex_resolution_for, BoxGrid)
+from utils.PV_ArtefactIO import (find_artefact, read_artefact, write_artefact, artefact_path, join_geometry,
+                                 box_ids, aligned_columns, ARTEFACT_FORMATS, DEFAULT_FORMAT)
+from utils.mcdm_score import mcdm_score_calculation, mcdm_score_frame
+from utils.PV_BuildCache import BuildManifest
+from utils import (PV_GridBuilder, PV_BoxCentroidScore, PV_ZonalEngine, PV_LandUseEngine, PV_ArtefactIO,
+                   mcdm_score as mcdm_module)
 
 
 ### ============================== EXTRACT THE SCORE ============================== ###
 
-### Step: Create Grid Box of Fix geometries
-
-class Pv_creategrid(QgsProcessingAlgorithm):
-    P_input_vector_layer = "input_vector_layer"
-    P_create_grid_result = "CreategridResult"
-    P_input_crs = 'input_crs'
-    P_hspace = 'input_horizontal_spacing'
-    P_vspace = 'input_vertical_spacing'
-    P_region_name = 'region_name'
-
-    def initAlgorithm(self, config=None):
-        self.addParameter(QgsProcessingParameterCrs(self.P_input_crs, 'input crs', defaultValue='EPSG:4326'))
-        self.addParameter(QgsProcessingParameterVectorLayer(self.P_input_vector_layer, 'input vector layer',
-                                                            types=[QgsProcessing.TypeVectorAnyGeometry],
-                                                            defaultValue=None))
-        self.addParameter(QgsProcessingParameterNumber(self.P_vspace, 'input vertical spacing',
-                                                       type=QgsProcessingParameterNumber.Double, defaultValue=None))
-        self.addParameter(QgsProcessingParameterNumber(self.P_hspace , 'input horizontal spacing',
-                                                       type=QgsProcessingParameterNumber.Double, defaultValue=None))
-        self.addParameter(
-            QgsProcessingParameterFeatureSink(self.P_create_grid_result, 'CreateGrid Result', type=QgsProcessing.TypeVectorAnyGeometry,
-                                              createByDefault=True, defaultValue=None))
-        self.addParameter(QgsProcessingParameterString(self.P_region_name, 'region_name', multiLine=False, defaultValue=''))
-
-    def processAlgorithm(self, parameters, context, model_feedback):
-        # Use a multi-step feedback, so that individual child algorithm progress reports are adjusted for the
-        # overall progress through the model
-        feedback = QgsProcessingMultiStepFeedback(7, model_feedback)
-        results = {}
-        outputs = {}
-
-        # Create grid
-        alg_params = {
-            'CRS': parameters[self.P_input_crs],
-            'EXTENT': parameters[self.P_input_vector_layer],
-            'HOVERLAY': 0,
-            'HSPACING': parameters[self.P_hspace ],
-            'TYPE': 2,  # Rectangle (Polygon)
-            'VOVERLAY': 0,
-            'VSPACING': parameters[self.P_vspace],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['CreateGrid'] = processing.run('native:creategrid', alg_params, context=context, feedback=feedback,
-                                               is_child_algorithm=True)
-
-        feedback.setCurrentStep(1)
-        if feedback.isCanceled():
-            return {}
-
-        # Create spatial index
-        alg_params = {
-            'INPUT': outputs['CreateGrid']['OUTPUT']
-        }
-        outputs['CreateSpatialIndex'] = processing.run('native:createspatialindex', alg_params, context=context,
-                                                       feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(2)
-        if feedback.isCanceled():
-            return {}
-
-        # Clip
-        alg_params = {
-            'INPUT': outputs['CreateSpatialIndex']['OUTPUT'],
-            'OVERLAY': parameters[self.P_input_vector_layer],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['Clip'] = processing.run('native:clip', alg_params, context=context, feedback=feedback,
-                                         is_child_algorithm=True)
-
-        feedback.setCurrentStep(3)
-        if feedback.isCanceled():
-            return {}
-
-        # Add geometry attributes
-        alg_params = {
-            'CALC_METHOD': 0,  # Layer CRS
-            'INPUT': outputs['Clip']['OUTPUT'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['AddGeometryAttributes'] = processing.run('qgis:exportaddgeometrycolumns', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(4)
-        if feedback.isCanceled():
-            return {}
-
-        # Rename field
-        alg_params = {
-            'FIELD': 'id',
-            'INPUT': outputs['AddGeometryAttributes']['OUTPUT'],
-            'NEW_NAME': 'box_id',
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['RenameField'] = processing.run('native:renametablefield', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(5)
-        if feedback.isCanceled():
-            return {}
-
-        # Drop field(s)
-        alg_params = {
-            'COLUMN': ['left','top','right','bottom','row_index','col_index'],
-            'INPUT': outputs['RenameField']['OUTPUT'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT 
-        }
-        outputs['DropFields'] = processing.run('native:deletecolumn', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-        
-        feedback.setCurrentStep(6)
-        if feedback.isCanceled():
-            return {}
-        
-        region_val = parameters[self.P_region_name]
-         # Field calculator
-        alg_params = {
-            'FIELD_LENGTH': 0,
-            'FIELD_NAME': 'region_name',
-            'FIELD_PRECISION': 0,
-            'FIELD_TYPE': 2,  # Text (string)
-            'FORMULA': f"'{region_val}'", 
-            'INPUT': outputs['DropFields']['OUTPUT'],
-            'OUTPUT': parameters[self.P_create_grid_result ]
-        }
-        outputs['FieldCalculator'] = processing.run('native:fieldcalculator', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-        results[self.P_create_grid_result ] = outputs['FieldCalculator']['OUTPUT']
-        return results
-
-    def name(self):return 'PV_CreateGrid'
-    def displayName(self):return 'PV_CreateGrid'
-    def group(self): return ''
-    def groupId(self): return ''
-    def createInstance(self): return Pv_creategrid()
-
-def runner_PvCreateGrid(input_path, create_grid_result_path, h_space: float, v_space: float,region_name, crs: str = "EPSG:2180"):
-
-    # Build parameter dict for the algorithm
-    params = {
-        Pv_creategrid.P_input_vector_layer: input_path,
-        Pv_creategrid.P_create_grid_result:  create_grid_result_path,
-        Pv_creategrid.P_hspace: h_space,
-        Pv_creategrid.P_vspace: v_space,
-        Pv_creategrid.P_input_crs: QgsCoordinateReferenceSystem(crs),
-        Pv_creategrid.P_region_name: region_name}
-
-    # Create a processing context & feedback
-    context = QgsProcessingContext()
-    feedback = QgsProcessingFeedback()
-    context.setProject(QgsProject.instance())
-
-    # Run the algorithm class directly
-    alg = Pv_creategrid()
-    alg.initAlgorithm()
-    result = alg.processAlgorithm(params, context, feedback)
-    print(f"Success: Saved to {create_grid_result_path}")
-    
-### Step: Create centroid 
-
-class Pv_createcentroid(QgsProcessingAlgorithm):
-    P_input_vector_layer  = "input_vector_layer"
-    P_centroid_result = "CentroidResult"
-    P_input_crs = 'input_crs'
-
-    def initAlgorithm(self, config=None):
-        self.addParameter(QgsProcessingParameterVectorLayer(self.P_input_vector_layer, 'input vector layer',
-                                                            types=[QgsProcessing.TypeVectorAnyGeometry],
-                                                            defaultValue=None))
-        self.addParameter(QgsProcessingParameterCrs(self.P_input_crs, 'input crs', defaultValue='EPSG:4326'))
-        self.addParameter(
-            QgsProcessingParameterFeatureSink(self.P_centroid_result, 'Centroid Result', type=QgsProcessing.TypeVectorAnyGeometry,
-                                              createByDefault=True, supportsAppend=True, defaultValue=None))
-
-    def processAlgorithm(self, parameters, context, model_feedback):
-        # Use a multi-step feedback, so that individual child algorithm progress reports are adjusted for the
-        # overall progress through the model
-        feedback = QgsProcessingMultiStepFeedback(4, model_feedback)
-        results = {}
-        outputs = {}
-
-        # Centroids
-        alg_params = {
-            'ALL_PARTS': True,
-            'INPUT': parameters[self.P_input_vector_layer],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT }
-        outputs['Centroids'] = processing.run('native:centroids', alg_params, context=context, feedback=feedback,
-                                              is_child_algorithm=True)
-
-        feedback.setCurrentStep(1)
-        if feedback.isCanceled():
-            return {}
-
-        # Reproject layer
-        alg_params = {
-            'CONVERT_CURVED_GEOMETRIES': False,
-            'INPUT': outputs['Centroids']['OUTPUT'],
-            'OPERATION': '',
-            'TARGET_CRS': parameters[self.P_input_crs],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ReprojectLayer'] = processing.run('native:reprojectlayer', alg_params, context=context,
-                                                   feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(2)
-        if feedback.isCanceled():
-            return {}
-
-        # Add X/Y fields to layer
-        alg_params = {
-            'CRS': QgsCoordinateReferenceSystem('EPSG:4326'),
-            'INPUT': outputs['ReprojectLayer']['OUTPUT'],
-            'PREFIX': '',
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['AddXyFieldsToLayer'] = processing.run('native:addxyfields', alg_params, context=context,
-                                                       feedback=feedback, is_child_algorithm=True)
-        
-        feedback.setCurrentStep(3)
-        if feedback.isCanceled():
-            return {}
-        
-        # Delete duplicates by attribute
-        alg_params = {
-            'FIELDS': ['box_id'],
-            'INPUT': outputs['AddXyFieldsToLayer']['OUTPUT'],
-            'OUTPUT': parameters[self.P_centroid_result]
-        }
-        outputs['DeleteDuplicatesByAttribute'] = processing.run('native:removeduplicatesbyattribute', alg_params, context=context, feedback=feedback, is_child_algorithm=True)
-        
-        results[self.P_centroid_result] = outputs['DeleteDuplicatesByAttribute']['OUTPUT']
-        return results
-
-    def name(self): return 'PV_CreateCentroid'
-    def displayName(self): return 'PV_CreateCentroid'
-    def group(self): return ''
-    def groupId(self): return ''
-    def createInstance(self): return Pv_createcentroid()
-    
-def runner_PvCreateCentroid(input_path,centroid_result, crs: str = "EPSG:4326"):
-    # Build parameter dict for the algorithm
-    params = {
-        Pv_createcentroid.P_input_vector_layer: input_path,
-        Pv_createcentroid.P_input_crs: QgsCoordinateReferenceSystem(crs),
-        Pv_createcentroid.P_centroid_result: centroid_result,
-    }
-
-    # Create a processing context & feedback
-    context = QgsProcessingContext()
-    feedback = QgsProcessingFeedback()
-    context.setProject(QgsProject.instance())
-
-    alg = Pv_createcentroid()
-    alg.initAlgorithm()
-    result = alg.processAlgorithm(params, context, feedback)
-
-    print(f"Created Centroid is Completed {centroid_result}")   
-    
-
-## Step: zonal statistic
-class Pv_zonalstatistic(QgsProcessingAlgorithm):
-    P_input_vector_layer = "input_vector_layer"
-    P_input_raster = "input_raster_layer"
-    P_OUT = 'ZonalStatisticResult'
-
-    def initAlgorithm(self, config=None):
-        self.addParameter(
-            QgsProcessingParameterRasterLayer(self.P_input_raster, 'input raster layer', defaultValue=None))
-        self.addParameter(QgsProcessingParameterVectorLayer(self.P_input_vector_layer, 'input vector layer',
-                                                            types=[QgsProcessing.TypeVectorAnyGeometry],
-                                                            defaultValue=None))
-        self.addParameter(QgsProcessingParameterFeatureSink(self.P_OUT, 'Zonal statistic result',
-                                                            type=QgsProcessing.TypeVectorAnyGeometry,
-                                                            createByDefault=True, supportsAppend=True,
-                                                            defaultValue=None))
-
-    def processAlgorithm(self, parameters, context, model_feedback):
-        # Use a multi-step feedback, so that individual child algorithm progress reports are adjusted for the
-        # overall progress through the model
-        feedback = QgsProcessingMultiStepFeedback(2, model_feedback)
-        results = {}
-        outputs = {}
-
-        # Clip raster by mask layer
-        alg_params = {
-            'ALPHA_BAND': False,
-            'CROP_TO_CUTLINE': True,
-            'DATA_TYPE': 0,  # Use Input Layer Data Type
-            'EXTRA': '',
-            'INPUT': parameters[self.P_input_raster],
-            'KEEP_RESOLUTION': False,
-            'MASK': parameters[self.P_input_vector_layer ],
-            'MULTITHREADING': False,
-            'NODATA': None,
-            'OPTIONS': '',
-            'SET_RESOLUTION': False,
-            'SOURCE_CRS': None,
-            'TARGET_CRS': None,
-            'TARGET_EXTENT': None,
-            'X_RESOLUTION': None,
-            'Y_RESOLUTION': None,
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['ClipRasterByMaskLayer'] = processing.run('gdal:cliprasterbymasklayer', alg_params, context=context,
-                                                          feedback=feedback, is_child_algorithm=True)
-
-        feedback.setCurrentStep(1)
-        if feedback.isCanceled():
-            return {}
-
-        # Zonal statistics
-        alg_params = {
-            'COLUMN_PREFIX': '_',
-            'INPUT': parameters[self.P_input_vector_layer ],
-            'INPUT_RASTER': outputs['ClipRasterByMaskLayer']['OUTPUT'],
-            'RASTER_BAND': 1,
-            'STATISTICS': [0, 1, 2],  # Count,Sum,Mean
-            'OUTPUT': parameters[self.P_OUT]
-        }
-        outputs['ZonalStatistics'] = processing.run('native:zonalstatisticsfb', alg_params, context=context,
-                                                    feedback=feedback, is_child_algorithm=True)
-        results[self.P_OUT] = outputs['ZonalStatistics']['OUTPUT']
-        return results
-
-    def name(self): return 'PV_ZonalStatistic'
-    def displayName(self): return 'PV_ZonalStatistic'
-    def group(self): return ''
-    def groupId(self): return ''
-    def createInstance(self): return Pv_zonalstatistic()
-
-def runner_PvZonalStatistic(vector_path,raster_path,output_path):
-    # Example inputs
-    # Build parameter dict for the algorithm
-    params = {
-        Pv_zonalstatistic.P_input_vector_layer:vector_path,
-        Pv_zonalstatistic.P_input_raster : raster_path,
-        Pv_zonalstatistic.P_OUT: output_path,
-    }
-
-    # Create a processing context & feedback
-    context = QgsProcessingContext()
-    feedback = QgsProcessingFeedback()
-    context.setProject(QgsProject.instance())
-
-    # Run the algorithm class directly
-    alg = Pv_zonalstatistic()
-    # Normally the framework calls initAlgorithm; when running directly it's safe to call it once:
-    alg.initAlgorithm()
-    result = alg.processAlgorithm(params, context, feedback)
-    
-    print(f"calculated zonal statistic Done -> {output_path}")
-
-## Step: Landuse ratio
-
-class Pv_landuseratio(QgsProcessingAlgorithm):
-    P_input_box_grid = "input_box_grid"
-    P_input_land_layer = "input_land_layer"
-    P_OUT = 'LandUseScore'
-
-    def initAlgorithm(self, config=None):
-        self.addParameter(QgsProcessingParameterVectorLayer(self.P_input_box_grid, 'input box grid',
-                                                            types=[QgsProcessing.TypeVectorAnyGeometry],
-                                                            defaultValue=None))
-        self.addParameter(QgsProcessingParameterVectorLayer(self.P_input_land_layer, 'input land layer',
-                                                            types=[QgsProcessing.TypeVectorAnyGeometry],
-                                                            defaultValue=None))
-        self.addParameter(
-            QgsProcessingParameterFeatureSink(self.P_OUT, 'land use score', type=QgsProcessing.TypeVectorAnyGeometry,
-                                              createByDefault=True, supportsAppend=True, defaultValue=None))
-
-    def processAlgorithm(self, parameters, context, model_feedback):
-        # Use a multi-step feedback, so that individual child algorithm progress reports are adjusted for the
-        # overall progress through the model
-        feedback = QgsProcessingMultiStepFeedback(3, model_feedback)
-        results = {}
-        outputs = {}
-
-        # Intersection
-        alg_params = {
-            'GRID_SIZE': None,
-            'INPUT': parameters[self.P_input_box_grid],
-            'INPUT_FIELDS': [''],
-            'OVERLAY': parameters[self.P_input_land_layer],
-            'OVERLAY_FIELDS': [''],
-            'OVERLAY_FIELDS_PREFIX': '',
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['Intersection'] = processing.run('native:intersection', alg_params, context=context, feedback=feedback,
-                                                 is_child_algorithm=True)
-
-        feedback.setCurrentStep(1)
-        if feedback.isCanceled():
-            return {}
-
-        # Add geometry attributes
-        alg_params = {
-            'CALC_METHOD': 0,  # Layer CRS
-            'INPUT': outputs['Intersection']['OUTPUT'],
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        outputs['AddGeometryAttributes'] = processing.run('qgis:exportaddgeometrycolumns', alg_params, context=context,
-                                                          feedback=feedback, is_child_algorithm=True)
-        feedback.setCurrentStep(2)
-        if feedback.isCanceled():
-            return {}
-
-        # Field calculator
-        alg_params = {
-            'FIELD_LENGTH': 0,
-            'FIELD_NAME': 'ratio',
-            'FIELD_PRECISION': 0,
-            'FIELD_TYPE': 0,  # Decimal (double)
-            'FORMULA': ' "area_2" / "area" ',
-            'INPUT': outputs['AddGeometryAttributes']['OUTPUT'],
-            'OUTPUT': parameters[self.P_OUT]
-        }
-        outputs['FieldCalculator'] = processing.run('native:fieldcalculator', alg_params, context=context,
-                                                    feedback=feedback, is_child_algorithm=True)
-        results[self.P_OUT] = outputs['FieldCalculator']['OUTPUT']
-        return results
-
-    def name(self): return 'PV_LandUseRatio'
-    def displayName(self): return 'PV_LandUseRatio'
-    def group(self): return ''
-    def groupId(self): return ''
-    def createInstance(self): return Pv_landuseratio()
-
-
-def runner_PvLandUseRatio(input_vector,input_land_vector,output_path):
-    
-    # Build parameter dict for the algorithm
-    params = {
-        Pv_landuseratio.P_input_box_grid: input_vector,
-        Pv_landuseratio.P_input_land_layer: input_land_vector,
-        Pv_landuseratio.P_OUT: output_path,
-    }
-
-    # Create a processing context & feedback
-    context = QgsProcessingContext()
-    feedback = QgsProcessingFeedback()
-    context.setProject(QgsProject.instance())
-
-    # Run the algorithm class directly
-    alg = Pv_landuseratio()
-    # Normally the framework calls initAlgorithm; when running directly it's safe to call it once:
-    alg.initAlgorithm()
-    result = alg.processAlgorithm(params, context, feedback)
-
-    print(f"calculated land ratio Done -> {output_path}")
-
 ## ============================ Final score
 
 def final_score(extraction_path, final_score_out, region):
     """
-    Merges all spatial score layers for a specific region into one GeoJSON.
+    Merges all score tables for a specific region into one narrow table
+    (box_id + scores, no geometry; format from the suffix of final_score_out).
+    The grid geometry is joined once, when the MCDM result is exported.
     """
     base_path = Path(extraction_path) / 'score' / region
     
-    # 1. Initialize with main grid geometry
-    grid_path = base_path / f'grid_box_{region}.geojson'
-    if not grid_path.exists():
-        raise FileNotFoundError(f"Base grid not found at {grid_path}")
+    # 1. Initialize with the box ids of the main grid
+    grid_path = find_artefact(base_path, f'grid_box_{region}')
+    if grid_path is None:
+        raise FileNotFoundError(f"Base grid not found at {base_path / f'grid_box_{region}'}.*")
         
-    grid_box = gpd.read_file(grid_path)
-    grid_box['box_id'] = grid_box['box_id'].astype(str) # Ensure string for merging
-    processed_dfs = [grid_box]
+    # Integer box_ids of the grid are the shared index; every score column is
+    # placed into a preallocated array by position instead of merged
+    grid_ids = box_ids(read_artefact(grid_path, columns=['box_id'])['box_id'])
+    index = pd.Index(grid_ids)
+    columns = {}
+
+    def place(df, mapping):
+        columns.update(aligned_columns(index, df['box_id'], {new: df[old].to_numpy() for old, new in mapping.items()}))
 
     # 2. Configuration: {file_suffix: (old_column_name, new_column_name)}
     # Standard layers (box2...)
@@ -556,51 +68,71 @@ def final_score(extraction_path, final_score_out, region):
         for suffix, (old_col, new_col) in layers_dict.items():
             f_path = base_path / f'score_{suffix}_{region}.geojson'
             if f_path.exists():
-                df = gpd.read_file(f_path)
-                df['box_id'] = df['box_id'].astype(str)
                 # Select only necessary columns
-                df = df[['box_id', old_col]].rename(columns={old_col: new_col})
-                processed_dfs.append(df)
+                place(read_artefact(f_path, columns=['box_id', old_col]), {old_col: new_col})
             else:
                 print(f"Warning: File missing -> {f_path.name}")
 
-    load_and_append(standard_layers)
-    load_and_append(zonal_layers)
+    # Proximity scores (dso/solar/station/road) come from one compact table;
+    # fall back to the legacy per-layer score_box2* files for older runs
+    proximity_path = find_artefact(base_path, f'score_proximity_{region}')
+    if proximity_path is not None:
+        proximity_df = read_artefact(proximity_path)
+        place(proximity_df, {c: c for c in proximity_df.columns if c.endswith('_score')})
+    else:
+        load_and_append(standard_layers)
+
+    # Zonal scores (dni/pvout/temp/dem) come from one table as well;
+    # fall back to the legacy per-raster score_{name} files for older runs
+    zonal_path = find_artefact(base_path, f'score_zonal_{region}')
+    if zonal_path is not None:
+        zonal_df = read_artefact(zonal_path)
+        place(zonal_df, {f'{name}_mean': new_col for name, (_, new_col) in zonal_layers.items()
+                         if f'{name}_mean' in zonal_df.columns})
+    else:
+        load_and_append(zonal_layers)
 
-    # 4. Handle Land Ratio (Requires aggregation)
+    # 4. Land ratio: one row per box (box_id, land_score, fclass); older runs
+    # wrote one row per box x land-use fragment, which still needs the aggregation
+    land_table_path = next((p for p in (base_path / f'score_landRatio_{region}.parquet',
+                                        base_path / f'score_landRatio_{region}.csv') if p.exists()), None)
     land_path = base_path / f'score_landRatio_{region}.geojson'
-    if land_path.exists():
-        land_df = gpd.read_file(land_path)
-        land_df['box_id'] = land_df['box_id'].astype(str)
+    if land_table_path is not None:
+        land_df = read_artefact(land_table_path, columns=['box_id', 'land_score', 'fclass'])
+        place(land_df, {'land_score': 'land_score', 'fclass': 'fclass'})
+    elif land_path.exists():
+        land_df = read_artefact(land_path, columns=['box_id', 'ratio', 'fclass'])
         land_agg = land_df.groupby('box_id', as_index=False).agg({
             'ratio': 'sum',
             'fclass': lambda x: x.value_counts().index[0]
-        }).rename(columns={'ratio': 'land_score'})
-        processed_dfs.append(land_agg)
+        })
+        place(land_agg, {'ratio': 'land_score', 'fclass': 'fclass'})
 
-    # 5. Execute Sequential Merge
-    df_merged = reduce(lambda left, right: pd.merge(left, right, on='box_id', how='left'), processed_dfs)
-
-    # 6. Final Column Ordering
+    # 5. Final Column Ordering
     cols_order = [
         'box_id', 'dni_score', 'pvout_score', 'temp_score', 'dem_score',
         'dso_score', 'solar_score', 'station_score', 'road_score', 
-        'land_score', 'fclass', 'area', 'perimeter', 'region_name', 'geometry'
+        'land_score', 'fclass'
     ]
     
-    # Keep only columns that exist in the dataframe
-    final_cols = [c for c in cols_order if c in df_merged.columns]
-    final_df = df_merged[final_cols].copy()
+    # Keep only columns that were found, built in one go from the aligned arrays
+    final_df = pd.DataFrame({'box_id': grid_ids, **{c: columns[c] for c in cols_order if c in columns}})
 
-    # 7. Save to GeoJSON
-    final_df.to_file(final_score_out, driver='GeoJSON')
+    # 6. Save (GeoParquet by default, GeoJSON for a .geojson path)
+    write_artefact(final_df, final_score_out)
     print(f"Done! Final file saved: {final_score_out}")
 
 ### ======================== MCDM Score
 
-def runnner_mcdm_score(input_path,output_path):
-    mcdm_score_gdf = mcdm_score_calculation(input_path)
-    mcdm_score_gdf.to_file(output_path, driver='GeoJSON')
+def runnner_mcdm_score(input_path, grid_path, output_path, export_path=None):
+    """
+    MCDM scores of the narrow final-score table, joined to the grid geometry
+    (the only join of it); export_path also writes the GeoJSON uploaded to the web app.
+    """
+    mcdm_score_gdf = join_geometry(mcdm_score_calculation(input_path), grid_path)
+    write_artefact(mcdm_score_gdf, output_path)
+    if export_path is not None and Path(export_path) != Path(output_path):
+        write_artefact(mcdm_score_gdf, export_path)
     print(f"Successfully saved MCDM score results to {output_path}")
     
 
@@ -653,6 +185,8 @@ def run_pipeline(args):
     input_path = Path(args.input_path)
     extraction_path = input_path
     region = args.region_name
+    # refinement levels write to their own score folder and grid their own boundary
+    score_name = getattr(args, 'score_name', None) or region
     h_space = args.h_space
     v_space = args.v_space
     
@@ -661,28 +195,39 @@ def run_pipeline(args):
     centroid_dso_path = extraction_path / 'extraction' /region /  f'centroid_dso_{region}.geojson'
     centroid_solar_path =extraction_path / 'extraction' /region /  f'centroid_solar_{region}.geojson'
     centroid_station_path = extraction_path / 'extraction' /region / f'railwayStation_filter_{region}.geojson'
-    centroid_road_path = extraction_path / 'extraction' /region / f'roadVertices_filter_{region}.geojson'
+    centroid_road_path = extraction_path / 'extraction' /region / f'roadLines_filter_{region}.geojson'
     dni_path = extraction_path / 'extraction' /region / f'dni_clip_{region}.tif'
     pvout_path = extraction_path / 'extraction' /region / f'pvout_clip_{region}.tif'
     temp_path = extraction_path / 'extraction' /region / f'temp_clip_{region}.tif'
     dem_path = extraction_path / 'extraction' /region / f'dem_clip_{region}.tif'
     landuse_path = extraction_path / 'extraction' /region /  f'landUse_filter_{region}.geojson'
+    boundary_path = Path(args.boundary_path) if getattr(args, 'boundary_path', None) else fixgeometries_path
     
     
-    # 3. output paths
-    grid_box_out = extraction_path / 'score'/ region / f'grid_box_{region}.geojson'
-    centroid_box_out = extraction_path / 'score'/ region / f'centroid_box_{region}.geojson'
-    score_box2dso_out = extraction_path / 'score'/ region / f'score_box2dso_{region}.geojson'
-    score_box2solar_out = extraction_path / 'score'/ region / f'score_box2solar_{region}.geojson'
-    score_box2station_out = extraction_path / 'score'/ region / f'score_box2station_{region}.geojson'
-    score_box2road_out = extraction_path / 'score'/ region / f'score_box2road_{region}.geojson'
-    score_dni_out = extraction_path / 'score'/ region / f'score_dni_{region}.geojson'
-    score_pvout_out = extraction_path / 'score'/ region / f'score_pvout_{region}.geojson' 
-    score_temp_out = extraction_path / 'score'/ region / f'score_temp_{region}.geojson' 
-    score_dem_out = extraction_path / 'score'/ region / f'score_dem_{region}.geojson'
-    land_ratio_out = extraction_path / 'score'/ region / f'score_landRatio_{region}.geojson'
-    final_score_out = extraction_path / 'score'/ region / f'final_score_{region}.geojson'
-    mcdm_score_out = extraction_path / 'score'/ region / f'mcdm_score_{region}.geojson'
+    # 3. output paths (GeoParquet artefacts by default, --artefact-format geojson for GeoJSON / CSV)
+    score_dir = extraction_path / 'score'/ score_name
+    fmt = getattr(args, 'artefact_format', DEFAULT_FORMAT)
+    grid_box_out = artefact_path(score_dir, f'grid_box_{score_name}', fmt)
+    box_grid_out = score_dir / f'grid_box_{score_name}.npz'  # implicit grid (row/col/coverage)
+    # cells the scoring steps read: centres and pixel labels from row/col for box grids, the polygons for hex grids
+    # (the polygon layer grid_box_out is the export / refinement layer)
+    scoring_grid = box_grid_out if args.grid == "box" else grid_box_out
+    centroid_box_out = artefact_path(score_dir, f'centroid_box_{score_name}', fmt, table=True)  # box_id, x, y
+    score_proximity_out = artefact_path(score_dir, f'score_proximity_{score_name}', fmt, table=True)
+    score_zonal_out = artefact_path(score_dir, f'score_zonal_{score_name}', fmt, table=True)  # dni/pvout/temp/dem in one table
+    land_ratio_out = artefact_path(score_dir, f'score_landRatio_{score_name}', fmt, table=True)
+    final_score_out = artefact_path(score_dir, f'final_score_{score_name}', fmt, table=True)
+    mcdm_score_out = artefact_path(score_dir, f'mcdm_score_{score_name}', fmt)
+    mcdm_export_out = score_dir / f'mcdm_score_{score_name}.geojson'  # web app upload
+    index_cache_dir = extraction_path / 'cache' / 'spatial_index'  # shared by all regions, keyed by file hash
+    zonal_cache_dir = extraction_path / 'cache' / 'zonal_weights'  # labelled strips, keyed by grid + raster grid (--zonal-cache)
+    # working-memory budget of the streaming steps; unset keeps each step's own default
+    # (not a step parameter: chunk / strip sizes never change the results)
+    budget = {} if args.max_bytes is None else {'max_bytes': args.max_bytes}
+    # step fingerprints (input hashes, parameters, code); file hashes are memoised in cache/digests/,
+    # shared with the spatial-index bundles so each input is hashed once per change
+    digest_dir = extraction_path / 'cache'
+    manifest = BuildManifest(score_dir / f'build_manifest_{score_name}.json', digest_dir=digest_dir)
     
   
    # allow choosing steps (0..etc) or 'all'
@@ -690,97 +235,166 @@ def run_pipeline(args):
     if args.steps:
         for s in args.steps:
             if s == "all":
-                steps_to_run = set(map(str, range(0, 13)))
+                steps_to_run = set(map(str, range(0, 6)))
                 break
             steps_to_run.add(str(s))
     else:
-        steps_to_run = set(map(str, range(0, 13)))  # default: run all steps
+        steps_to_run = set(map(str, range(0, 6)))  # default: run all steps
 
-    def should_run(output_path: Path, step_id: str, input_file: Path):
+    def should_run(step_id: str, outputs, inputs, params=None, code=()):
+        """Selected step whose first input exists and whose inputs, params or code changed since its last run."""
         if step_id not in steps_to_run: 
             return False
-        if not input_file.exists():
-            print(f"Error: Input file for Step {step_id} missing at {input_file}")
+        if not Path(inputs[0]).exists():
+            print(f"Error: Input file for Step {step_id} missing at {inputs[0]}")
             return False
-        return args.force or not output_path.exists()
+        return manifest.is_stale(step_id, outputs, inputs, params, code + (PV_ArtefactIO,), force=args.force)
     
     
     ## 1) Create box
-    if should_run(grid_box_out, "0",fixgeometries_path):
+    hex_res = args.hex_res if args.hex_res is not None else hex_resolution_for(h_space)
+    grid_params = {'grid': args.grid, 'region': region, 'crs': PROJECTED_CRS,
+                   **({'hex_res': hex_res} if args.grid == "hex" else
+                      {'h_space': h_space, 'v_space': v_space, 'origin': getattr(args, 'grid_origin', None)})}
+    grid_outputs = [grid_box_out, centroid_box_out] + ([box_grid_out] if args.grid == "box" else [])
+    if should_run("0", grid_outputs, [boundary_path], grid_params, (PV_GridBuilder,)):
         grid_box_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"Step 0: Creating box grid → {grid_box_out}")
-        runner_PvCreateGrid(str(fixgeometries_path), str(grid_box_out), h_space, v_space, region_name=region)
+        if args.grid == "hex":
+            # hexagonal cells, box_id = hierarchical hex id; every later step works on it unchanged
+            runner_PvCreateHexGrid(str(boundary_path), str(grid_box_out), hex_res, region_name=region)
+        else:
+            runner_PvCreateGrid(str(boundary_path), str(grid_box_out), h_space, v_space, region_name=region,
+                                box_grid_path=str(box_grid_out), origin=getattr(args, 'grid_origin', None))
     ## 2) Create centroid-box
         centroid_box_out.parent.mkdir(parents=True, exist_ok=True)
         print(f"Step 1: Creating centroid box → {centroid_box_out} ")
-        runner_PvCreateCentroid(str(grid_box_out), str(centroid_box_out))
+        runner_PvCreateCentroid(str(scoring_grid), str(centroid_box_out))
+        manifest.record("0")
         
-    ## 3) Calculate distance centroid box-dso
-    if should_run(score_box2dso_out , "1",centroid_dso_path):
-        score_box2dso_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 2: Calculate score box2dso → {score_box2dso_out}")
-        runner_PV_Box2Dso(str(centroid_box_out), str(centroid_dso_path), str(score_box2dso_out))
-        
-     ## 4) calculate distance centroid box-solar
-    if should_run(score_box2solar_out , "2",centroid_solar_path):
-        score_box2solar_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 3: Calculatescore box2solar → {score_box2solar_out}")
-        runner_PV_Box2Plant(str(centroid_box_out), str(centroid_solar_path), str(score_box2solar_out))
-     
-    ## 5) calculate distance centroid box-station 
-    if should_run(score_box2station_out , "3",centroid_station_path):
-        score_box2station_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 4: Calculate score box2station → {score_box2station_out}")
-        runner_PV_Box2Railway(str(centroid_box_out), str(centroid_station_path), str(score_box2station_out))
-
-    ## 6) calculate distance centroid box-road vertices
-    if should_run(score_box2road_out, "4",centroid_road_path):
-        score_box2road_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 5: Calculate score box2road → {score_box2road_out}")
-        runner_PV_Box2Road(str(centroid_box_out), str(centroid_road_path), str(score_box2road_out))
-    
-    ## 7) calculate zonal DNI
-    if should_run(score_dni_out, "5",dni_path):
-        score_dni_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 6: Calculate score dni → {score_dni_out}")
-        runner_PvZonalStatistic(str(grid_box_out), str(dni_path), str(score_dni_out))
-    
-    ## 8) calculate zonal PVOUT
-    if should_run(score_pvout_out, "6",pvout_path):
-        score_pvout_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 7: Calculate score pvout → {score_pvout_out}")
-        runner_PvZonalStatistic(str(grid_box_out), str(pvout_path), str(score_pvout_out))
-    
-      
-    ## 9) calculate zonal TEMP
-    if should_run(score_temp_out, "7",temp_path):
-        score_temp_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 8: Calculate score temp → {score_temp_out}")
-        runner_PvZonalStatistic(str(grid_box_out), str(temp_path), str(score_temp_out))
+    ## 3) Calculate distance + score centroid box -> dso / solar / station / road (one read, one write)
+    proximity_layers = {
+        'dso':     {**PROXIMITY_LAYERS['dso'],     'path': str(centroid_dso_path)},
+        'solar':   {**PROXIMITY_LAYERS['solar'],   'path': str(centroid_solar_path)},
+        'station': {**PROXIMITY_LAYERS['station'], 'path': str(centroid_station_path)},
+        'road':    {**PROXIMITY_LAYERS['road'],    'path': str(centroid_road_path)},
+    }
+    if args.network_dso:
+        # grid-connection cost along the clipped roads instead of straight-line distance
+        proximity_layers['dso'].update(mode='network', network_path=str(centroid_road_path))
+    proximity_inputs = [centroid_box_out, centroid_dso_path, centroid_solar_path, centroid_station_path, centroid_road_path]
+    if should_run("1", [score_proximity_out], proximity_inputs, {'layers': proximity_layers}, (PV_BoxCentroidScore,)):
+        score_proximity_out.parent.mkdir(parents=True, exist_ok=True)
+        print(f"Step 2: Calculate proximity scores {list(PROXIMITY_LAYERS)} → {score_proximity_out}")
+        runner_PV_Box2Feature(str(centroid_box_out), proximity_layers, str(score_proximity_out),
+                              workers=args.workers, index_cache_dir=str(index_cache_dir),
+                              digest_dir=str(digest_dir), **budget)
+        manifest.record("1")
     
-    ## 10) calculate zonal DEM
-    if should_run(score_dem_out, "8",dem_path):
-        score_dem_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 9: Calculate score dem → {score_dem_out}")
-        runner_PvZonalStatistic(str(grid_box_out), str(dem_path), str(score_dem_out))
+    ## 4) calculate zonal DNI / PVOUT / TEMP / DEM (one label array, one table)
+    zonal_rasters = {'dni': dni_path, 'pvout': pvout_path, 'temp': temp_path, 'dem': dem_path}
+    if should_run("2", [score_zonal_out], [scoring_grid, *zonal_rasters.values()], {'zonal_mode': args.zonal_mode},
+                  (PV_ZonalEngine, PV_GridBuilder)):
+        score_zonal_out.parent.mkdir(parents=True, exist_ok=True)
+        print(f"Step 3: Calculate zonal scores dni/pvout/temp/dem → {score_zonal_out}")
+        runner_PvZonalStatisticMulti(str(scoring_grid), {k: str(v) for k, v in zonal_rasters.items()},
+                                     str(score_zonal_out), mode=args.zonal_mode,
+                                     cache_dir=str(zonal_cache_dir) if args.zonal_cache else None, **budget)
+        manifest.record("2")
     
-    ## 11) Calculate land ratio 
-    if should_run(land_ratio_out, "9",landuse_path):
+    ## 5) Calculate land ratio 
+    land_params = {'land_mode': args.land_mode, **({'land_res': args.land_res} if args.land_mode == "raster" else {})}
+    if should_run("3", [land_ratio_out], [scoring_grid, landuse_path], land_params,
+                  (PV_LandUseEngine, PV_ZonalEngine, PV_GridBuilder)):
         land_ratio_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 10: Calcualte Land ratio → {land_ratio_out}")
-        runner_PvLandUseRatio(str(grid_box_out), str(landuse_path), str(land_ratio_out))
+        print(f"Step 4: Calcualte Land ratio → {land_ratio_out}")
+        runner_PvLandUseRatio(str(scoring_grid), str(landuse_path), str(land_ratio_out),
+                              mode=args.land_mode, res=args.land_res, **budget)
+        manifest.record("3")
     
-    ## 12) Calculate the final score
-    if should_run(final_score_out, "10",extraction_path):
+    ## 6) Calculate the final score
+    if should_run("4", [final_score_out], [grid_box_out, score_proximity_out, score_zonal_out, land_ratio_out],
+                  code=(final_score,)):
         final_score_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 11: Creating final score for MCDM → {final_score_out}")
-        final_score(str(extraction_path), str(final_score_out), region)
+        print(f"Step 5: Creating final score for MCDM → {final_score_out}")
+        final_score(str(extraction_path), str(final_score_out), score_name)
+        manifest.record("4")
     
-    ## 12) calcualting mcdm score
-    if should_run(mcdm_score_out, "11",final_score_out):
+    ## 7) calcualting mcdm score
+    if should_run("5", [mcdm_score_out, mcdm_export_out], [final_score_out, grid_box_out],
+                  code=(runnner_mcdm_score, mcdm_module)):
         mcdm_score_out.parent.mkdir(parents=True, exist_ok=True)
-        print(f"Step 11: Calculate score for MCDM → {mcdm_score_out}")
-        runnner_mcdm_score(str(final_score_out), str(mcdm_score_out))
+        print(f"Step 6: Calculate score for MCDM → {mcdm_score_out}")
+        runnner_mcdm_score(str(final_score_out), str(grid_box_out), str(mcdm_score_out), str(mcdm_export_out))
+        manifest.record("5")
+
+
+def run_refinement(args):
+    """
+    Coarse-to-fine scoring: score the region at args.refine_levels[0], keep the
+    top args.refine_top % of the current-level cells by TOPSIS, rescore only
+    those at the next (finer) spacing, and repeat down to the last level.
+
+    Each level is a normal run_pipeline (steps 0-4) into score/{region}_r{spacing}/,
+    gridded on the union of the kept cells with the lattice snapped to the
+    coarse grid origin, so fine cells nest exactly inside their parents.
+    Discarded cells keep their coarser scores; TOPSIS is recomputed on the
+    combined mixed-resolution table after every level, so ranks stay comparable.
+    Writes score/{region}/mcdm_score_refined_{region} (artefact + GeoJSON export) with a cell_size column.
+    """
+    if args.grid == "hex":
+        raise ValueError("Refinement needs the nested box grid, run it with --grid box")
+    levels = sorted(args.refine_levels, reverse=True)
+    for coarse, fine in zip(levels, levels[1:]):
+        if coarse % fine:
+            raise ValueError(f"Refinement spacings must divide each other, got {coarse} -> {fine}")
+
+    region = args.region_name
+    score_root = Path(args.input_path) / 'score'
+    combined, boundary_path, origin = None, None, None
+
+    for level, spacing in enumerate(levels):
+        score_name = f"{region}_r{int(spacing)}"
+        print(f"Refinement level {level}: {spacing:g} m → {score_name}")
+        level_args = argparse.Namespace(**{**vars(args), 'h_space': spacing, 'v_space': spacing,
+                                           'steps': [str(i) for i in range(0, 5)], 'score_name': score_name,
+                                           'boundary_path': boundary_path, 'grid_origin': origin})
+        run_pipeline(level_args)
+
+        if origin is None:
+            box_grid = BoxGrid.load(score_root / score_name / f'grid_box_{score_name}.npz')
+            origin = (box_grid.origin_x, box_grid.origin_y)
+
+        # box_ids are per level, tag them with the spacing so the combined table stays unique
+        level_dir = score_root / score_name
+        level_gdf = join_geometry(read_artefact(find_artefact(level_dir, f'final_score_{score_name}')),
+                                  find_artefact(level_dir, f'grid_box_{score_name}'))
+        level_gdf['box_id'] = f"{int(spacing)}_" + level_gdf['box_id'].astype(str)
+        level_gdf['cell_size'] = spacing
+        if combined is None:
+            combined = level_gdf
+        else:
+            combined = pd.concat([combined[~combined['box_id'].isin(refined_ids)], level_gdf], ignore_index=True)
+        combined = mcdm_score_frame(combined.drop(columns=['topsis_score', 'topsis_rank'], errors='ignore'))
+
+        if level == len(levels) - 1:
+            break
+
+        # top-N% of this level's cells (ties and NaN scores are never refined)
+        current = combined[combined['cell_size'] == spacing].dropna(subset=['topsis_score'])
+        n_keep = max(1, int(np.ceil(len(current) * args.refine_top / 100.0)))
+        keep = current.nlargest(n_keep, 'topsis_score')
+        refined_ids = set(keep['box_id'])
+        print(f"Refinement level {level}: refining {n_keep}/{len(current)} cells")
+
+        boundary = gpd.GeoDataFrame(geometry=[keep.geometry.union_all()], crs=combined.crs)
+        boundary_path = score_root / score_name / f'refine_boundary_{score_name}.geojson'
+        boundary.to_file(boundary_path, driver='GeoJSON')
+
+    out_path = artefact_path(score_root / region, f'mcdm_score_refined_{region}', args.artefact_format)
+    write_artefact(combined, out_path)
+    write_artefact(combined, out_path.with_suffix('.geojson'))  # web app export
+    print(f"Refined MCDM score saved to {out_path}")
      
     
     
@@ -791,9 +405,35 @@ if __name__ == "__main__":
     parser.add_argument("--steps", nargs="+", help='Steps to run (e.g., 0 1 or "all")')
     parser.add_argument("--input-path", type=str, required=True, help="Root input directory")
     parser.add_argument("--region-name", type=str, required=True, help="Name of the region (e.g., dolnoslaskie)")
-    parser.add_argument("--force", action="store_true", help="Overwrite existing output files")
+    parser.add_argument("--force", action="store_true",
+                        help="Rerun the selected steps even when their inputs, parameters and code are unchanged")
     parser.add_argument("--h-space", type=float, default=1000.0, help="Horizontal spacing for grid (default: 250.0)")
     parser.add_argument("--v-space", type=float, default=1000.0, help="Vertical spacing for grid (default: 250.0)")
+    parser.add_argument("--network-dso", action="store_true", help="Score DSO proximity by road-network distance")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Threads for the proximity queries (default: one per CPU core); results do not depend on it")
+    parser.add_argument("--max-bytes", type=int, default=None,
+                        help="Working-memory budget in bytes of the proximity, zonal and raster land-use steps "
+                             "(default: 512 MB per proximity call, 256 MB per raster strip)")
+    parser.add_argument("--grid", choices=["box", "hex"], default="box", help="Grid cell shape (default: box)")
+    parser.add_argument("--zonal-mode", choices=["centre", "coverage"], default="centre",
+                        help="Pixel-to-box rule for raster scores; 'coverage' weights pixels by covered fraction "
+                             "(use it when boxes are about the raster pixel size or smaller)")
+    parser.add_argument("--zonal-cache", action="store_true",
+                        help="Keep the pixel labels of the zonal step under cache/zonal_weights and reuse them while "
+                             "the grid and the raster pixel grid are unchanged (disk for speed, results are identical)")
+    parser.add_argument("--land-mode", choices=["vector", "raster"], default="vector",
+                        help="Land-use ratio: exact polygon overlay or pixel-count fast path (default: vector)")
+    parser.add_argument("--land-res", type=float, default=10.0,
+                        help="Pixel size in metres of the raster land-use mode (default: 10)")
+    parser.add_argument("--artefact-format", choices=ARTEFACT_FORMATS, default=DEFAULT_FORMAT,
+                        help=f"Format of the intermediate score artefacts (default: {DEFAULT_FORMAT}); "
+                             "the MCDM result is always exported as GeoJSON too")
+    parser.add_argument("--hex-res", type=int, default=None, help="Hex resolution (default: derived from --h-space)")
+    parser.add_argument("--refine-levels", type=float, nargs="+", default=None,
+                        help="Coarse-to-fine spacings, e.g. 1000 500 250 (runs the refinement mode)")
+    parser.add_argument("--refine-top", type=float, default=10.0,
+                        help="Percent of cells refined at each level (default: 10)")
     #parser.add_argument("--extraction-path", type=str, required=True, help="Root output directory")
     
     regions_list = [
@@ -814,7 +454,10 @@ if __name__ == "__main__":
             "--steps", "all",
             
         ])
-        run_pipeline(simulated_args)
+        if simulated_args.refine_levels:
+            run_refinement(simulated_args)
+        else:
+            run_pipeline(simulated_args)
     
     # args = parser.parse_args()
     # run_pipeline(args)
@@ -0,0 +1,59 @@
+"""
+Hex hierarchy consistency (utils/PV_GridBuilder.py).
+
+Run from qgis(WP2+data): python -m pytest -q tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.PV_GridBuilder import hex_from_xy, hex_parent, hex_children, hex_aggregate, hex_decode
+
+RES = 10
+
+
+@pytest.fixture(scope="module")
+def cells():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(2e5, 8e5, 50_000), rng.uniform(1e5, 8e5, 50_000)
+    return np.unique(hex_from_xy(x, y, RES))
+
+
+@pytest.mark.parametrize("levels", [2, 3, 5, RES])
+def test_multi_level_parent_is_repeated_parent(cells, levels):
+    stepwise = cells
+    for _ in range(levels):
+        stepwise = hex_parent(stepwise)
+    assert np.array_equal(hex_parent(cells, RES - levels), stepwise)
+    assert (hex_decode(stepwise)[2] == RES - levels).all()
+
+
+def test_scalar_parent(cells):
+    assert hex_parent(cells[0], RES - 2) == hex_parent(hex_parent(cells[0]))
+
+
+def test_children_invert_parent(cells):
+    for ancestor in np.unique(hex_parent(cells[:200], RES - 2)):
+        children = hex_children(ancestor)
+        assert len(children) == 4
+        assert (hex_parent(children) == ancestor).all()
+        grandchildren = hex_children(ancestor, RES)
+        assert len(grandchildren) == 16
+        assert np.array_equal(np.sort(grandchildren), np.sort(np.concatenate([hex_children(c) for c in children])))
+    # every cell is a descendant of its ancestor
+    ancestors = hex_parent(cells[:200], RES - 2)
+    assert all(c in set(hex_children(a, RES)) for c, a in zip(cells[:200], ancestors))
+
+
+def test_aggregate_level_by_level_equals_one_step(cells):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"box_id": cells, "area": rng.uniform(0.1, 1.0, len(cells)), "dni": rng.normal(1100, 50, len(cells))})
+
+    one_step = hex_aggregate(df, ["dni"], RES - 3, weight_col="area")
+    level = df
+    for res in range(RES - 1, RES - 4, -1):
+        level = hex_aggregate(level, ["dni"], res, weight_col="area")
+
+    assert np.array_equal(one_step["box_id"].to_numpy(), level["box_id"].to_numpy())
+    np.testing.assert_allclose(level["dni"], one_step["dni"], rtol=1e-12)
+    np.testing.assert_allclose(level["area"], one_step["area"], rtol=1e-12)
@@ -0,0 +1,148 @@
+import json
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+from typing import Iterable, Optional
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # GeoParquet needs pyarrow; without it artefacts stay GeoJSON / CSV
+    pq = None
+
+
+# ============================================================
+# Pipeline artefact I/O (GeoParquet by default, GeoJSON as export target)
+# ============================================================
+
+ARTEFACT_FORMATS = ("parquet", "geojson")
+DEFAULT_FORMAT = "parquet" if pq is not None else "geojson"
+PARQUET_COMPRESSION = "zstd"
+
+# lookup order when a stage reads an artefact of unknown format (older runs wrote GeoJSON / CSV)
+_SUFFIXES = (".parquet", ".geojson", ".csv")
+
+def artefact_path(directory, stem: str, fmt: str = DEFAULT_FORMAT, table: bool = False) -> Path:
+    """
+    directory/stem + suffix of fmt. Tables without geometry (table=True) are
+    .parquet, or .csv when fmt is 'geojson' (GeoJSON needs a geometry).
+    """
+    if fmt not in ARTEFACT_FORMATS:
+        raise ValueError(f"Unknown artefact format {fmt!r}, expected one of {ARTEFACT_FORMATS}")
+    if fmt == "parquet":
+        suffix = ".parquet"
+    else:
+        suffix = ".csv" if table else ".geojson"
+    return Path(directory) / f"{stem}{suffix}"
+
+def find_artefact(directory, stem: str) -> Optional[Path]:
+    """Existing directory/stem.{parquet,geojson,csv} (first match), None when the stage has not run."""
+    for suffix in _SUFFIXES:
+        p = Path(directory) / f"{stem}{suffix}"
+        if p.exists():
+            return p
+    return None
+
+def write_artefact(df: pd.DataFrame, path):
+    """
+    Write df in the format given by the suffix of path: .parquet (GeoParquet with
+    WKB geometry for GeoDataFrames, plain Parquet otherwise), .geojson or .csv.
+    """
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    geo = isinstance(df, gpd.GeoDataFrame)
+    if p.suffix == ".parquet":
+        if pq is None:
+            raise ImportError("Writing .parquet artefacts needs pyarrow, install it or use --artefact-format geojson")
+        if geo:
+            df.to_parquet(p, index=False, compression=PARQUET_COMPRESSION)
+        else:
+            pd.DataFrame(df).to_parquet(p, index=False, compression=PARQUET_COMPRESSION)
+    elif p.suffix == ".geojson":
+        if not geo:
+            raise ValueError(f"GeoJSON artefact needs a geometry column: {p}")
+        df.to_file(p, driver="GeoJSON")
+    elif p.suffix == ".csv":
+        pd.DataFrame(df).drop(columns="geometry", errors="ignore").to_csv(p, index=False)
+    else:
+        raise ValueError(f"Unsupported artefact suffix {p.suffix!r}: {p}")
+
+def _parquet_is_geo(path: Path) -> bool:
+    metadata = pq.read_schema(path).metadata or {}
+    return b"geo" in metadata
+
+def _parquet_geometry_column(path: Path) -> str:
+    return json.loads(pq.read_schema(path).metadata[b"geo"])["primary_column"]
+
+def read_artefact(path, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Read an artefact written by write_artefact (or a legacy GeoJSON / CSV).
+
+    columns selects the columns to read; with Parquet only those column chunks
+    are decoded. Asking for 'geometry' (or columns=None on a spatial artefact)
+    returns a GeoDataFrame, otherwise a plain DataFrame.
+    """
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"File not found: {p.resolve()}")
+    columns = None if columns is None else list(columns)
+    if p.suffix == ".parquet":
+        if pq is None:
+            raise ImportError("Reading .parquet artefacts needs pyarrow")
+        if _parquet_is_geo(p):
+            geometry = _parquet_geometry_column(p)
+            if columns is None or geometry in columns or "geometry" in columns:
+                cols = None if columns is None else [geometry if c == "geometry" else c for c in columns]
+                return gpd.read_parquet(p, columns=cols)
+        return pd.read_parquet(p, columns=columns)
+    if p.suffix == ".csv":
+        return pd.read_csv(p, usecols=columns)
+    if columns is None or "geometry" in columns:
+        return gpd.read_file(p, columns=None if columns is None else [c for c in columns if c != "geometry"])
+    return pd.DataFrame(gpd.read_file(p, columns=columns, ignore_geometry=True))
+
+# ============================================================
+# Box-aligned tables (integer box_id index, columns placed by position)
+# ============================================================
+
+def box_ids(values) -> np.ndarray:
+    """box_id column as int64 (legacy layers stored it as text or float)."""
+    return pd.to_numeric(pd.Series(values)).to_numpy(np.int64)
+
+def aligned_columns(index: pd.Index, ids, columns: dict) -> dict:
+    """
+    Place every column of columns (arrays aligned with ids) at the position of
+    its box in index, one preallocated array per column. Boxes of index that
+    are missing from ids stay NaN (None for text columns), ids not in index
+    are dropped. index must be unique, e.g. the box_ids of the grid.
+    """
+    pos = index.get_indexer(box_ids(ids))
+    hit = pos >= 0
+    out = {}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if values.dtype.kind in "biuf":
+            col = np.full(len(index), np.nan)
+        else:
+            col = np.full(len(index), None, dtype=object)
+        col[pos[hit]] = values[hit]
+        out[name] = col
+    return out
+
+GRID_COLUMNS = ["box_id", "area", "perimeter", "region_name", "geometry"]
+
+def join_geometry(table: pd.DataFrame, grid_path, columns: Iterable[str] = GRID_COLUMNS) -> gpd.GeoDataFrame:
+    """
+    Attach the box attributes and polygons of the grid artefact to a narrow
+    box_id + metric table (left join in grid order). Score tables carry no
+    geometry; this is the one place it is joined back, at export. box_id is
+    written as text, as the web app expects.
+    """
+    columns = list(columns)
+    grid = read_artefact(grid_path, columns=columns).reset_index(drop=True)
+    metric_cols = [c for c in table.columns if c not in columns]
+    placed = aligned_columns(pd.Index(box_ids(grid["box_id"])), table["box_id"],
+                             {c: table[c].to_numpy() for c in metric_cols})
+    metrics = pd.DataFrame({"box_id": grid["box_id"].astype(str).to_numpy(), **placed})
+    attrs = grid[[c for c in columns if c != "box_id"]]
+    return gpd.GeoDataFrame(pd.concat([metrics, attrs], axis=1), geometry="geometry", crs=grid.crs)
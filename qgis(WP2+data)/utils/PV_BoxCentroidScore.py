@@ -1,10 +1,24 @@
 import os
+import re
+import time
+import shutil
+import pickle
+import tempfile
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 import geopandas as gpd
-from typing import Optional, Iterable
+from typing import Optional, Iterable, Callable
 from pathlib import Path
 from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix, bmat
+from scipy.sparse.csgraph import dijkstra
+import shapely
+from shapely.strtree import STRtree
+from pyproj import Transformer
+
+from utils.PV_ArtefactIO import read_artefact, write_artefact
+from utils.PV_BuildCache import file_digest
 
 
 # 0. Read GeoJSON file
@@ -22,148 +36,622 @@ def read_geojson(path: str) -> gpd.GeoDataFrame:
         gdf = gdf.to_crs(4326)
     return gdf
 
+EARTH_RADIUS_KM = 6371.0
+
 def haversine_vec(lat1, lon1, lat2, lon2):
     # lat1/lon1 shape (N,1), lat2/lon2 shape (1,M) -> result (N,M)
+    # also works element-wise on two (N,) arrays -> result (N,)
     lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
     dlat = lat2 - lat1
     dlon = lon2 - lon1
     a = np.sin(dlat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(dlon/2)**2
-    return 2 * 6371 * np.arcsin(np.sqrt(a))
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
 
-def box2dso(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    # main: N boxes; secondary: M DSOs
-    lat_g = main_centroid["y"].to_numpy()[:, None]  # (N,1)
-    lon_g = main_centroid["x"].to_numpy()[:, None]  # (N,1)
-    lat_s = secondary_centroid["y"].to_numpy()[None, :]  # (1,M)
-    lon_s = secondary_centroid["x"].to_numpy()[None, :]  # (1,M)
+# ============================================================
+# Bounded-memory chunking
+# ============================================================
 
-    D = haversine_vec(lat_g, lon_g, lat_s, lon_s)  # (N,M)
-    idx_min = np.argmin(D, axis=1)                # (N,)
-    dist_min = D[np.arange(D.shape[0]), idx_min]  # (N,)
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2  # working-memory budget per scorer call (512 MB)
 
-    # prepare result (don’t mutate original)
-    out = main_centroid.copy()
-    out["nearest_dso_id"] = secondary_centroid["dso_id"].to_numpy()[idx_min]
-    # keep x=lon, y=lat (no swap!)
-    out["nearest_dso_x"]  = secondary_centroid["x"].to_numpy()[idx_min]
-    out["nearest_dso_y"]  = secondary_centroid["y"].to_numpy()[idx_min]
-    out["distance_km"]    = dist_min
+# rough per-box temporaries of each query path, used to turn max_bytes into a chunk size
+_NEAREST_BYTES_PER_ROW = 160    # xyz / query result / gathered lon-lat / haversine temporaries
+_PROJECTED_BYTES_PER_ROW = 64   # query result on an already projected (N,2) array
+_LINE_BYTES_PER_ROW = 256       # shapely point per box + query_nearest output
 
-    dmin, dmax = float(dist_min.min()), float(dist_min.max())
-    out["score"] = 1.0 if dmax == dmin else 1.0 - (dist_min - dmin) / (dmax - dmin)
-    
-    return out
+# progress(label, rows_done, rows_total)
+ProgressCallback = Callable[[str, int, int], None]
 
+def resolve_workers(workers: int) -> int:
+    """workers <= 0 means one worker per CPU core."""
+    return (os.cpu_count() or 1) if workers <= 0 else workers
 
-def box2railway(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    # main: N boxes; secondary: M DSOs
-    lat_g = main_centroid["y"].to_numpy()[:, None]  # (N,1)
-    lon_g = main_centroid["x"].to_numpy()[:, None]  # (N,1)
-    lat_s = secondary_centroid["y"].to_numpy()[None, :]  # (1,M)
-    lon_s = secondary_centroid["x"].to_numpy()[None, :]  # (1,M)
+def chunk_size_for(bytes_per_row: float, max_bytes: int = DEFAULT_MAX_BYTES, workers: int = 1) -> int:
+    """Rows per chunk so that the temporaries of all concurrently running chunks stay within max_bytes."""
+    return max(1, int(max_bytes // resolve_workers(workers) // max(bytes_per_row, 1)))
 
-    D = haversine_vec(lat_g, lon_g, lat_s, lon_s)  # (N,M)
-    idx_min = np.argmin(D, axis=1)  # (N,)
-    dist_min = D[np.arange(D.shape[0]), idx_min]  # (N,)
+def map_chunks(fn: Callable[[int, int], None], n: int, chunk_size: int, workers: int = 1,
+               progress: Optional[ProgressCallback] = None, label: str = ""):
+    """
+    Call fn(start, end) for every row chunk of [0, n).
+
+    fn writes its results into preallocated output arrays, so chunks are
+    independent and the merged result is in box order whatever order they finish in.
+    With workers > 1 the chunks run on a thread pool: cKDTree queries, NumPy ufuncs
+    and shapely 2 vectorized calls release the GIL, and the trees / coordinate
+    arrays are shared read-only between threads instead of being pickled per task.
+    progress(label, rows_done, n) is reported from the calling thread.
+    """
+    bounds = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+    workers = resolve_workers(workers)
+
+    if workers == 1 or len(bounds) <= 1:
+        for start, end in bounds:
+            fn(start, end)
+            if progress is not None:
+                progress(label, end, n)
+        return
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fn, start, end): end - start for start, end in bounds}
+        for future in as_completed(futures):
+            future.result()  # re-raise worker errors
+            done += futures[future]
+            if progress is not None:
+                progress(label, done, n)
+
+def print_progress(label: str, done: int, total: int):
+    """Progress callback for interactive runs."""
+    print(f"{label}: processed {done}/{total} rows ({100 * done / max(total, 1):.1f}%)")
 
-    # prepare result (don’t mutate original)
-    out = main_centroid.copy()
-    out["nearest_station_id"] = secondary_centroid["station_id"].to_numpy()[idx_min]
-    # keep x=lon, y=lat (no swap!)
-    out["nearest_station_x"] = secondary_centroid["x"].to_numpy()[idx_min]
-    out["nearest_station_y"] = secondary_centroid["y"].to_numpy()[idx_min]
-    out["distance_km"] = dist_min
+# ============================================================
+# Nearest-neighbour engine (unit-sphere KD-tree)
+# ============================================================
 
-    dmin, dmax = float(dist_min.min()), float(dist_min.max())
-    out["score"] = 1.0 if dmax == dmin else 1.0 - (dist_min - dmin) / (dmax - dmin)
+def lonlat_to_xyz(lon, lat) -> np.ndarray:
+    """Map lon/lat degrees onto the unit sphere -> (N,3) cartesian array."""
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+def build_sphere_tree(secondary_centroid: gpd.GeoDataFrame) -> cKDTree:
+    """KD-tree over the target points embedded on the unit sphere."""
+    xyz = lonlat_to_xyz(secondary_centroid["x"].to_numpy(), secondary_centroid["y"].to_numpy())
+    return cKDTree(xyz)
+
+def nearest_haversine(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+                      tree: Optional[cKDTree] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                      progress: Optional[ProgressCallback] = None, label: str = "nearest",
+                      dtype=np.float64, workers: int = 1):
+    """
+    Exact great-circle nearest neighbour for every box centroid.
+
+    The chord length between two unit vectors is a monotone function of the
+    great-circle angle, so the nearest point in 3D is also the nearest point on
+    the sphere. Building the tree is O(M log M) and the query O(N log M), with
+    O(N + M) memory instead of the dense (N, M) haversine matrix. Boxes are
+    queried in chunks sized from max_bytes and written into preallocated arrays,
+    on `workers` threads sharing the same tree.
+
+    Returns:
+        dist_km: (N,) haversine distance to the nearest target
+        idx: (N,) positional index into secondary_centroid
+    """
+    if len(secondary_centroid) == 0:
+        raise ValueError("Target layer is empty, cannot compute nearest distances.")
+    if tree is None:
+        tree = build_sphere_tree(secondary_centroid)
+
+    lon_g = main_centroid["x"].to_numpy(dtype=np.float64)
+    lat_g = main_centroid["y"].to_numpy(dtype=np.float64)
+    lon_s = secondary_centroid["x"].to_numpy(dtype=np.float64)
+    lat_s = secondary_centroid["y"].to_numpy(dtype=np.float64)
+
+    n = len(lon_g)
+    dist_km = np.empty(n, dtype=dtype)
+    idx = np.empty(n, dtype=np.int64)
+
+    def query_chunk(start, end):
+        _, idx[start:end] = tree.query(lonlat_to_xyz(lon_g[start:end], lat_g[start:end]), k=1)
+        # recompute the matched pairs with haversine so distances are identical to the old matrix version
+        hit = idx[start:end]
+        dist_km[start:end] = haversine_vec(lat_g[start:end], lon_g[start:end], lat_s[hit], lon_s[hit])
+
+    map_chunks(query_chunk, n, chunk_size_for(_NEAREST_BYTES_PER_ROW, max_bytes, workers), workers, progress, label)
+    return dist_km, idx
+
+def km_to_chord(dist_km):
+    """Great-circle distance -> chord length on the unit sphere (inverse of chord_to_km)."""
+    return 2 * np.sin(np.asarray(dist_km, dtype=np.float64) / (2 * EARTH_RADIUS_KM))
+
+def chord_to_km(chord):
+    """Chord length on the unit sphere -> great-circle distance in km."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2, 0.0, 1.0))
+
+# ============================================================
+# k-nearest / within-radius aggregates
+# ============================================================
+
+def knn_radius_aggregates(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+                          prefix: str, k: Optional[int] = None, radii_km: Iterable = (),
+                          weight_col: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                          progress: Optional[ProgressCallback] = None, workers: int = 1,
+                          tree: Optional[cKDTree] = None) -> pd.DataFrame:
+    """
+    Batched k-NN and radius aggregates per box, on the unit-sphere KD-tree.
+
+    Args:
+        main_centroid: N box centroids with x (lon) / y (lat)
+        secondary_centroid: M targets with x / y (and weight_col if given)
+        prefix: column prefix, e.g. 'dso'
+        k: number of nearest targets for {prefix}_knn{k}_mean_km
+        radii_km: radii for {prefix}_count_{r}km (and {prefix}_{weight_col}_sum_{r}km)
+        weight_col: numeric target column summed within each radius (e.g. installed capacity)
+        max_bytes: memory budget; the chunk size accounts for k and the expected pairs per box
+        tree: prebuilt build_sphere_tree(secondary_centroid), e.g. from load_target_index
+
+    Returns:
+        DataFrame aligned with main_centroid (N rows), one column per aggregate.
+    """
+    if len(secondary_centroid) == 0:
+        raise ValueError("Target layer is empty, cannot compute aggregates.")
+    radii_km = sorted(float(r) for r in radii_km)
+    out = pd.DataFrame(index=main_centroid.index)
+
+    if tree is None:
+        tree = build_sphere_tree(secondary_centroid)
+    xyz = lonlat_to_xyz(main_centroid["x"].to_numpy(), main_centroid["y"].to_numpy())
+    n = len(xyz)
+    max_chord = float(km_to_chord(radii_km[-1])) if radii_km else 0.0
+
+    weights = None
+    if weight_col is not None:
+        weights = pd.to_numeric(secondary_centroid[weight_col], errors="coerce").fillna(0.0).to_numpy()
+
+    # bytes per box: k-NN results plus the expected number of (box, target) pairs inside the
+    # largest radius, estimated on a sample of boxes (24 bytes per pair record)
+    bytes_per_row = 48.0 + (k or 0) * 40
+    if radii_km:
+        sample = xyz[:: max(1, n // 1000)]
+        mean_pairs = tree.query_ball_point(sample, max_chord, return_length=True).mean() if len(sample) else 0.0
+        bytes_per_row += 48 * (mean_pairs + 1) * (1 + len(radii_km))
+
+    knn_mean = np.empty(n, dtype=np.float64) if k else None
+    counts = {r: np.zeros(n, dtype=np.int64) for r in radii_km}
+    sums = {r: np.zeros(n, dtype=np.float64) for r in radii_km} if weights is not None else {}
+
+    def aggregate_chunk(start, end):
+        chunk = xyz[start:end]
+
+        # mean distance of the k nearest targets (fewer than k targets -> mean of the ones that exist)
+        if k:
+            chord, _ = tree.query(chunk, k=k)
+            chord = chord.reshape(len(chunk), -1)
+            found = np.isfinite(chord)
+            dist_km = np.where(found, chord_to_km(np.where(found, chord, 0.0)), 0.0)
+            knn_mean[start:end] = dist_km.sum(axis=1) / np.maximum(found.sum(axis=1), 1)
+
+        # counts / weighted sums within each radius from one sparse box x target traversal at the largest radius
+        if radii_km:
+            pairs = cKDTree(chunk).sparse_distance_matrix(tree, max_distance=max_chord, output_type="ndarray")
+            for r in radii_km:
+                within = pairs["v"] <= km_to_chord(r)
+                rows = pairs["i"][within]
+                counts[r][start:end] = np.bincount(rows, minlength=len(chunk))
+                if weights is not None:
+                    sums[r][start:end] = np.bincount(rows, weights=weights[pairs["j"][within]], minlength=len(chunk))
+
+    map_chunks(aggregate_chunk, n, chunk_size_for(bytes_per_row, max_bytes, workers), workers, progress,
+               f"{prefix} aggregates")
+
+    if k:
+        out[f"{prefix}_knn{k}_mean_km"] = knn_mean
+    for r in radii_km:
+        out[f"{prefix}_count_{r:g}km"] = counts[r]
+        if weights is not None:
+            out[f"{prefix}_{weight_col}_sum_{r:g}km"] = sums[r]
 
     return out
 
-def box2road(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    # main: N boxes; secondary: M DSOs
-    lat_g = main_centroid["y"].to_numpy()[:, None]  # (N,1)
-    lon_g = main_centroid["x"].to_numpy()[:, None]  # (N,1)
-    lat_s = secondary_centroid["y"].to_numpy()[None, :]  # (1,M)
-    lon_s = secondary_centroid["x"].to_numpy()[None, :]  # (1,M)
+# ============================================================
+# Projected-CRS mode (planar KD-tree in metres)
+# ============================================================
+
+PROJECTED_CRS = "EPSG:2180"  # PUWG 1992, same CRS the box grid is built in
+
+def project_xy(gdf: gpd.GeoDataFrame, crs: str = PROJECTED_CRS) -> np.ndarray:
+    """Project the lon/lat x/y columns to a metric CRS -> (N,2) array in metres."""
+    pts = gpd.GeoSeries(gpd.points_from_xy(gdf["x"], gdf["y"]), crs=4326).to_crs(crs)
+    return np.column_stack([pts.x.to_numpy(), pts.y.to_numpy()])
+
+def nearest_projected(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+                      crs: str = PROJECTED_CRS, main_xy: Optional[np.ndarray] = None,
+                      max_bytes: int = DEFAULT_MAX_BYTES, progress: Optional[ProgressCallback] = None,
+                      label: str = "nearest", dtype=np.float64, workers: int = 1,
+                      tree: Optional[cKDTree] = None):
+    """
+    Nearest neighbour on a 2D KD-tree in a projected CRS.
+
+    Boxes and targets are projected once, so distances are real planar metres
+    (EPSG:2180 scale error is about ±0.1% across Poland) at 2D KD-tree speed.
+    Pass main_xy to reuse already projected box centroids across layers, and
+    tree (built on project_xy(secondary_centroid, crs)) to skip the tree build.
+
+    Returns:
+        dist_km: (N,) planar distance to the nearest target
+        idx: (N,) positional index into secondary_centroid
+    """
+    if len(secondary_centroid) == 0:
+        raise ValueError("Target layer is empty, cannot compute nearest distances.")
+    if main_xy is None:
+        main_xy = project_xy(main_centroid, crs)
+
+    if tree is None:
+        tree = cKDTree(project_xy(secondary_centroid, crs))
+    n = len(main_xy)
+    dist_km = np.empty(n, dtype=dtype)
+    idx = np.empty(n, dtype=np.int64)
+
+    def query_chunk(start, end):
+        dist_m, idx[start:end] = tree.query(main_xy[start:end], k=1)
+        dist_km[start:end] = dist_m / 1000.0
+
+    map_chunks(query_chunk, n, chunk_size_for(_PROJECTED_BYTES_PER_ROW, max_bytes, workers), workers, progress, label)
+    return dist_km, idx
+
+# ============================================================
+# Point-to-line mode (STRtree on road linestrings)
+# ============================================================
+
+def nearest_line(main_centroid: gpd.GeoDataFrame, secondary_lines: gpd.GeoDataFrame,
+                 crs: str = PROJECTED_CRS, main_xy: Optional[np.ndarray] = None,
+                 lines: Optional[np.ndarray] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 progress: Optional[ProgressCallback] = None, label: str = "nearest",
+                 dtype=np.float64, workers: int = 1):
+    """
+    True distance from every box centroid to the nearest line (e.g. clipped OSM roads).
+
+    The linestrings are indexed directly in a shapely STRtree and queried with
+    query_nearest, so the distance is measured to the line itself rather than
+    to the closest extracted vertex. Pass main_xy / lines to reuse geometries
+    that are already projected to crs.
+
+    Returns:
+        dist_km: (N,) planar distance to the nearest line
+        idx: (N,) positional index into secondary_lines
+    """
+    if len(secondary_lines) == 0:
+        raise ValueError("Target layer is empty, cannot compute nearest distances.")
+    if main_xy is None:
+        main_xy = project_xy(main_centroid, crs)
+    if lines is None:
+        lines = secondary_lines.geometry.to_crs(crs).to_numpy()
+
+    tree = STRtree(lines)
+    n = len(main_xy)
+    dist_km = np.empty(n, dtype=dtype)
+    idx = np.empty(n, dtype=np.int64)
+
+    def query_chunk(start, end):
+        (box_pos, line_pos), dist_m = tree.query_nearest(shapely.points(main_xy[start:end]),
+                                                         return_distance=True, all_matches=False)
+        # query_nearest returns (input, tree) index pairs; scatter them back into box order
+        idx[start + box_pos] = line_pos
+        dist_km[start + box_pos] = dist_m / 1000.0
+
+    map_chunks(query_chunk, n, chunk_size_for(_LINE_BYTES_PER_ROW, max_bytes, workers), workers, progress, label)
+    return dist_km, idx
+
+# ============================================================
+# Road-network mode (CSR road graph + multi-source Dijkstra)
+# ============================================================
+
+_NETWORK_BYTES_PER_ROW = 64  # box -> graph node snap query on an already projected (N,2) array
+
+def build_road_graph(road_lines: gpd.GeoDataFrame, crs: str = PROJECTED_CRS, snap_m: float = 1.0) -> dict:
+    """
+    Compact undirected road graph from (clipped) road linestrings.
+
+    Nodes are the line vertices rounded to snap_m, so roads sharing a junction
+    vertex are connected; edges are the consecutive vertex pairs of every line,
+    weighted by their length in metres (parallel edges keep the shortest).
+
+    Returns:
+        {'graph': (V, V) CSR matrix, 'node_xy': (V, 2) node coordinates in crs,
+         'node_tree': cKDTree over node_xy used to snap points onto the graph}
+    """
+    # single-part lines, so consecutive coordinates of one part are always connected
+    parts = shapely.get_parts(road_lines.geometry.to_crs(crs).to_numpy())
+    xy, line_idx = shapely.get_coordinates(parts, return_index=True)
+    if len(xy) < 2:
+        raise ValueError("Road layer is empty, cannot build a road graph.")
+
+    node_xy, node = np.unique(np.round(xy / snap_m).astype(np.int64), axis=0, return_inverse=True)
+    node = node.ravel()
+    node_xy = node_xy * snap_m
+
+    # consecutive vertices of the same line part form an edge
+    same_line = line_idx[1:] == line_idx[:-1]
+    u, v = node[:-1][same_line], node[1:][same_line]
+    w = np.hypot(*(xy[1:][same_line] - xy[:-1][same_line]).T)
+    keep = u != v
+    u, v, w = u[keep], v[keep], w[keep]
+
+    # both directions, shortest parallel edge first so unique() keeps it
+    u, v, w = np.concatenate([u, v]), np.concatenate([v, u]), np.concatenate([w, w])
+    order = np.lexsort((w, v, u))
+    u, v, w = u[order], v[order], w[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+
+    n_nodes = len(node_xy)
+    graph = csr_matrix((w[first], (u[first], v[first])), shape=(n_nodes, n_nodes))
+    return {'graph': graph, 'node_xy': node_xy, 'node_tree': cKDTree(node_xy)}
+
+def nearest_network(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+                    network: dict, crs: str = PROJECTED_CRS, main_xy: Optional[np.ndarray] = None,
+                    max_bytes: int = DEFAULT_MAX_BYTES, progress: Optional[ProgressCallback] = None,
+                    label: str = "nearest", dtype=np.float64, workers: int = 1):
+    """
+    Travel distance along the road graph from every box to its nearest target.
+
+    Each target is attached to its nearest graph node by a virtual node whose
+    edge is the snap distance, then ONE multi-source Dijkstra from all targets
+    labels every graph node with its network distance and closest target.
+    Boxes are snapped to their nearest node with the graph KD-tree, so
+
+        distance = box -> node (straight) + node -> target (network incl. target snap)
+
+    Boxes on road components without any target get inf.
 
-    D = haversine_vec(lat_g, lon_g, lat_s, lon_s)  # (N,M)
-    idx_min = np.argmin(D, axis=1)  # (N,)
-    dist_min = D[np.arange(D.shape[0]), idx_min]  # (N,)
+    Returns:
+        dist_km: (N,) network distance to the nearest target
+        idx: (N,) positional index into secondary_centroid (-1 where unreachable)
+    """
+    if len(secondary_centroid) == 0:
+        raise ValueError("Target layer is empty, cannot compute nearest distances.")
+    if main_xy is None:
+        main_xy = project_xy(main_centroid, crs)
+
+    graph, node_tree = network['graph'], network['node_tree']
+    n_nodes, m = graph.shape[0], len(secondary_centroid)
+
+    # virtual target nodes n_nodes .. n_nodes + m - 1, one edge each to the snapped graph node
+    snap_m, target_node = node_tree.query(project_xy(secondary_centroid, crs), k=1)
+    virtual = n_nodes + np.arange(m)
+    full = bmat([[graph, None], [None, csr_matrix((m, m))]], format="csr")
+    links = csr_matrix((np.maximum(snap_m, 1e-6), (virtual, target_node)), shape=full.shape)
+    full = (full + links + links.T).tocsr()
+
+    # full is symmetric already, so a directed traversal avoids a second symmetrised copy
+    net_m, _, sources = dijkstra(full, directed=True, indices=virtual, min_only=True, return_predecessors=True)
+
+    n = len(main_xy)
+    dist_km = np.empty(n, dtype=dtype)
+    idx = np.empty(n, dtype=np.int64)
+
+    def snap_chunk(start, end):
+        box_m, box_node = node_tree.query(main_xy[start:end], k=1)
+        dist_km[start:end] = (box_m + net_m[box_node]) / 1000.0
+        src = sources[box_node]
+        idx[start:end] = np.where(src >= 0, src - n_nodes, -1)
+
+    map_chunks(snap_chunk, n, chunk_size_for(_NETWORK_BYTES_PER_ROW, max_bytes, workers), workers, progress, label)
+    return dist_km, idx
+
+def nearest_target(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+                   mode: str = "haversine", main_xy: Optional[np.ndarray] = None, **engine_kwargs):
+    """
+    Dispatch to the 'haversine' (unit sphere), 'projected' (EPSG:2180 points), 'line'
+    or 'network' (road graph, needs network=build_road_graph(...)) engine.
+    engine_kwargs (tree / lines, max_bytes, progress, label, dtype, workers) are passed through unchanged.
+    """
+    if mode == "haversine":
+        return nearest_haversine(main_centroid, secondary_centroid, **engine_kwargs)
+    if mode == "projected":
+        return nearest_projected(main_centroid, secondary_centroid, main_xy=main_xy, **engine_kwargs)
+    if mode == "line":
+        return nearest_line(main_centroid, secondary_centroid, main_xy=main_xy, **engine_kwargs)
+    if mode == "network":
+        return nearest_network(main_centroid, secondary_centroid, main_xy=main_xy, **engine_kwargs)
+    raise ValueError(f"Unknown proximity mode {mode!r}, expected 'haversine', 'projected', 'line' or 'network'")
+
+def minmax_score(dist_km: np.ndarray, invert: bool = False):
+    """Closer is better (1.0 at the nearest box); invert=True makes farther better. inf (unreachable) scores 0."""
+    finite = dist_km[np.isfinite(dist_km)]
+    dmin, dmax = (float(finite.min()), float(finite.max())) if len(finite) else (0.0, 0.0)
+    score = np.ones_like(dist_km) if dmax == dmin else np.clip(1.0 - (dist_km - dmin) / (dmax - dmin), 0.0, 1.0)
+    score = np.where(np.isinf(dist_km), 0.0, score)
+    return 1 - score if invert else score
 
-    # prepare result (don’t mutate original)
+# ============================================================
+# Distance-decay scoring
+# ============================================================
+
+# Every decay maps distance_km -> score in [0, 1] with 1.0 at distance 0, in one
+# elementwise NumPy expression: scores are absolute (comparable across regions)
+# and can be computed chunk by chunk. 'minmax' is the old region-relative score.
+
+def decay_linear(dist_km, cutoff_km: float):
+    """1 at 0 km, falling linearly to 0 at cutoff_km and beyond."""
+    return np.clip(1.0 - dist_km / cutoff_km, 0.0, 1.0)
+
+def decay_exponential(dist_km, scale_km: float):
+    """exp(-d / scale_km): 0.37 at scale_km, 0.05 at 3 * scale_km."""
+    return np.exp(-dist_km / scale_km)
+
+def decay_logistic(dist_km, midpoint_km: float, width_km: float):
+    """Soft threshold: 0.5 at midpoint_km, dropping from ~0.88 to ~0.12 over midpoint_km -/+ 2 * width_km."""
+    return 1.0 / (1.0 + np.exp((dist_km - midpoint_km) / width_km))
+
+def decay_piecewise(dist_km, thresholds_km, scores):
+    """Step function: scores[i] for thresholds_km[i-1] <= d < thresholds_km[i] (len(scores) == len(thresholds_km) + 1)."""
+    thresholds_km, scores = np.asarray(thresholds_km, dtype=np.float64), np.asarray(scores, dtype=np.float64)
+    if len(scores) != len(thresholds_km) + 1:
+        raise ValueError("piecewise decay needs exactly one more score than thresholds")
+    return scores[np.searchsorted(thresholds_km, dist_km, side="right")]
+
+DECAY_FUNCTIONS = {
+    'minmax':      lambda dist_km: minmax_score(dist_km),
+    'linear':      decay_linear,
+    'exponential': decay_exponential,
+    'logistic':    decay_logistic,
+    'piecewise':   decay_piecewise,
+}
+
+def distance_score(dist_km: np.ndarray, decay: Optional[dict] = None, direction: str = "cost"):
+    """
+    Score distances with a registered decay function.
+
+    Args:
+        dist_km: (N,) distances
+        decay: {'fn': name in DECAY_FUNCTIONS, **params}, e.g. {'fn': 'linear', 'cutoff_km': 10};
+               None keeps the region-relative min-max score
+        direction: 'cost' (closer is better) or 'benefit' (farther is better, 1 - decay)
+    """
+    if direction not in ('cost', 'benefit'):
+        raise ValueError(f"direction must be 'cost' or 'benefit', got {direction!r}")
+    params = dict(decay or {'fn': 'minmax'})
+    name = params.pop('fn')
+    if name not in DECAY_FUNCTIONS:
+        raise ValueError(f"Unknown decay {name!r}, expected one of {sorted(DECAY_FUNCTIONS)}")
+    score = DECAY_FUNCTIONS[name](np.asarray(dist_km, dtype=np.float64), **params)
+    return 1.0 - score if direction == 'benefit' else score
+
+def _take_targets(values: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """values[idx], with NaN (numbers) or None (ids, strings) where idx is -1 (no reachable target)."""
+    found = idx >= 0
+    picked = values[np.where(found, idx, 0)] if len(values) else np.empty(len(idx), dtype=values.dtype)
+    if found.all():
+        return picked
+    if np.issubdtype(picked.dtype, np.floating):
+        return np.where(found, picked, np.nan)
+    return np.where(found, picked.astype(object), None)
+
+def box2target(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+               id_col: str, prefix: str, invert: bool = False,
+               mode: str = "haversine", max_bytes: int = DEFAULT_MAX_BYTES,
+               progress: Optional[ProgressCallback] = None, workers: int = 1,
+               decay: Optional[dict] = None, network: Optional[dict] = None) -> gpd.GeoDataFrame:
+    """
+    Generic box -> nearest target scorer shared by all box2* functions.
+
+    Args:
+        main_centroid: N box centroids with x (lon) / y (lat) columns
+        secondary_centroid: M targets with x / y and id_col columns
+        id_col: id column of the target layer (e.g. 'dso_id')
+        prefix: output column prefix, gives nearest_{prefix}_id/_x/_y
+        invert: score farther boxes higher (used for existing solar plants)
+        mode: 'haversine' (great-circle), 'projected' (planar metres in EPSG:2180) or
+              'network' (road distance, needs network=build_road_graph(...)); line targets
+              have no x / y and go through box2road_line instead
+        max_bytes: working-memory budget, boxes are queried in chunks that fit in it
+        progress: optional callback progress(label, rows_done, rows_total)
+        workers: threads querying chunks in parallel (<= 0: one per core)
+        decay: distance-decay config for distance_score (None: min-max over the region)
+        network: road graph of the 'network' mode
+
+    Boxes without a reachable target ('network' mode, road component without any
+    target) get distance inf, score 0 and a None id / NaN coordinates.
+    """
+    if mode not in ("haversine", "projected", "network"):
+        raise ValueError(f"Unknown box2target mode {mode!r}, expected 'haversine', 'projected' or 'network'")
+    if mode == "network" and network is None:
+        raise ValueError("mode 'network' needs network=build_road_graph(...)")
+    engine_kwargs = {"network": network} if mode == "network" else {}
+    dist_min, idx_min = nearest_target(main_centroid, secondary_centroid, mode=mode, max_bytes=max_bytes,
+                                       progress=progress, label=f"box2{prefix}", workers=workers, **engine_kwargs)
+
+    # prepare result (don’t mutate original); idx -1 must not wrap around to the last target
     out = main_centroid.copy()
-    out["nearest_road_id"] = secondary_centroid["road_id"].to_numpy()[idx_min]
+    out[f"nearest_{prefix}_id"] = _take_targets(secondary_centroid[id_col].to_numpy(), idx_min)
     # keep x=lon, y=lat (no swap!)
-    out["nearest_road_x"] = secondary_centroid["x"].to_numpy()[idx_min]
-    out["nearest_road_y"] = secondary_centroid["y"].to_numpy()[idx_min]
+    out[f"nearest_{prefix}_x"] = _take_targets(secondary_centroid["x"].to_numpy(), idx_min)
+    out[f"nearest_{prefix}_y"] = _take_targets(secondary_centroid["y"].to_numpy(), idx_min)
     out["distance_km"] = dist_min
-
-    dmin, dmax = float(dist_min.min()), float(dist_min.max())
-    out["score"] = 1.0 if dmax == dmin else 1.0 - (dist_min - dmin) / (dmax - dmin)
+    out["score"] = distance_score(dist_min, decay, direction="benefit" if invert else "cost")
 
     return out
 
+def box2dso(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+            max_bytes: int = DEFAULT_MAX_BYTES, progress: Optional[ProgressCallback] = None,
+            workers: int = 1) -> gpd.GeoDataFrame:
+    # main: N boxes; secondary: M DSOs
+    return box2target(main_centroid, secondary_centroid, id_col="dso_id", prefix="dso",
+                      max_bytes=max_bytes, progress=progress, workers=workers)
+
+
+def box2railway(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+                max_bytes: int = DEFAULT_MAX_BYTES, progress: Optional[ProgressCallback] = None,
+                workers: int = 1) -> gpd.GeoDataFrame:
+    # main: N boxes; secondary: M railway stations
+    return box2target(main_centroid, secondary_centroid, id_col="station_id", prefix="station",
+                      max_bytes=max_bytes, progress=progress, workers=workers)
+
+def box2road(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+             max_bytes: int = DEFAULT_MAX_BYTES, progress: Optional[ProgressCallback] = None,
+             workers: int = 1) -> gpd.GeoDataFrame:
+    # main: N boxes; secondary: M road vertices
+    return box2target(main_centroid, secondary_centroid, id_col="road_id", prefix="road",
+                      max_bytes=max_bytes, progress=progress, workers=workers)
+
 
 def box2road_optimized(
         main_centroid: gpd.GeoDataFrame,
         secondary_centroid: gpd.GeoDataFrame,
-        chunk_size: int = 10000
+        chunk_size: Optional[int] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        progress: Optional[ProgressCallback] = None,
+        workers: int = 1
 ) -> gpd.GeoDataFrame:
     """
-    Memory-efficient nearest neighbor search using chunking.
+    Memory-efficient brute-force nearest neighbor using chunking.
 
     Args:
         main_centroid: N boxes (300k rows)
         secondary_centroid: M roads (500k rows)
-        chunk_size: Process main data in chunks to limit memory
+        chunk_size: Rows per chunk; derived from max_bytes when None
+        max_bytes: Budget for the dense (chunk, M) distance block and its temporaries
+        progress: Optional callback progress(label, rows_done, rows_total)
+        workers: Threads computing chunks in parallel (<= 0: one per core)
     """
     N = len(main_centroid)
     M = len(secondary_centroid)
 
-    # Pre-extract secondary data once
-    lat_s = secondary_centroid["y"].to_numpy()  # (M,)
-    lon_s = secondary_centroid["x"].to_numpy()  # (M,)
+    # Pre-extract both sides once
+    lat_g = main_centroid["y"].to_numpy(dtype=np.float64)
+    lon_g = main_centroid["x"].to_numpy(dtype=np.float64)
+    lat_s = secondary_centroid["y"].to_numpy(dtype=np.float64)  # (M,)
+    lon_s = secondary_centroid["x"].to_numpy(dtype=np.float64)  # (M,)
     osm_ids = secondary_centroid["osm_id"].to_numpy()
 
+    # haversine_vec keeps ~6 float64 (chunk, M) temporaries alive at its peak
+    if chunk_size is None:
+        chunk_size = chunk_size_for(6 * 8 * M, max_bytes, workers)
+
     # Pre-allocate result arrays
-    nearest_ids = np.empty(N, dtype=osm_ids.dtype)
-    nearest_x = np.empty(N, dtype=np.float64)
-    nearest_y = np.empty(N, dtype=np.float64)
+    idx_min = np.empty(N, dtype=np.int64)
     distances = np.empty(N, dtype=np.float64)
 
-    # Process in chunks
-    for i in range(0, N, chunk_size):
-        end = min(i + chunk_size, N)
-        chunk_lat = main_centroid["y"].iloc[i:end].to_numpy()[:, None]  # (chunk,1)
-        chunk_lon = main_centroid["x"].iloc[i:end].to_numpy()[:, None]  # (chunk,1)
-
+    def nearest_chunk(start, end):
         # Compute distances for this chunk: (chunk, M)
-        D = haversine_vec(chunk_lat, chunk_lon, lat_s[None, :], lon_s[None, :])
-
-        # Find nearest for each row in chunk
-        idx_min = np.argmin(D, axis=1)
-        dist_min = D[np.arange(D.shape[0]), idx_min]
+        D = haversine_vec(lat_g[start:end, None], lon_g[start:end, None], lat_s[None, :], lon_s[None, :])
 
-        # Store results
-        nearest_ids[i:end] = osm_ids[idx_min]
-        nearest_x[i:end] = lon_s[idx_min]
-        nearest_y[i:end] = lat_s[idx_min]
-        distances[i:end] = dist_min
+        # Find nearest for each row in chunk, written in place
+        np.argmin(D, axis=1, out=idx_min[start:end])
+        distances[start:end] = D[np.arange(end - start), idx_min[start:end]]
 
-        # Optional: print progress
-        if (i // chunk_size) % 10 == 0:
-            print(f"Processed {end}/{N} rows ({100 * end / N:.1f}%)")
+    # Process in chunks
+    map_chunks(nearest_chunk, N, chunk_size, workers, progress, "box2road_optimized")
 
     # Build output
     out = main_centroid.copy()
-    out["nearest_road_id"] = nearest_ids
-    out["nearest_road_x"] = nearest_x
-    out["nearest_road_y"] = nearest_y
+    out["nearest_road_id"] = osm_ids[idx_min]
+    out["nearest_road_x"] = lon_s[idx_min]
+    out["nearest_road_y"] = lat_s[idx_min]
     out["distance_km"] = distances
-
-    # Compute score
-    dmin, dmax = distances.min(), distances.max()
-    out["score"] = 1.0 if dmax == dmin else 1.0 - (distances - dmin) / (dmax - dmin)
+    out["score"] = minmax_score(distances)
 
     return out
 
@@ -173,67 +661,280 @@ def box2road_optimized(
 
 def box2road_kdtree(
         main_centroid: gpd.GeoDataFrame,
-        secondary_centroid: gpd.GeoDataFrame
+        secondary_centroid: gpd.GeoDataFrame,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        progress: Optional[ProgressCallback] = None,
+        workers: int = 1
 ) -> gpd.GeoDataFrame:
     """
-    Ultra-fast nearest neighbor using KDTree.
-    Note: Uses Euclidean approximation, not exact haversine.
-    Good for local distances (<100km).
+    Ultra-fast nearest neighbor using a 2D KDTree in EPSG:2180.
+    Boxes and road vertices are projected once, so distance_km is in real
+    metres / 1000 instead of raw degrees * 111 km.
     """
-    # Build KDTree on secondary data
-    coords_secondary = np.column_stack([
-        secondary_centroid["x"].to_numpy(),
-        secondary_centroid["y"].to_numpy()
-    ])
-    tree = cKDTree(coords_secondary)
+    return box2target(main_centroid, secondary_centroid, id_col="road_id", prefix="road", mode="projected",
+                      max_bytes=max_bytes, progress=progress, workers=workers)
 
-    # Query nearest neighbor for each main point
-    coords_main = np.column_stack([
-        main_centroid["x"].to_numpy(),
-        main_centroid["y"].to_numpy()
-    ])
-    distances, indices = tree.query(coords_main, k=1)
+def box2road_line(main_centroid: gpd.GeoDataFrame, road_lines: gpd.GeoDataFrame,
+                  max_bytes: int = DEFAULT_MAX_BYTES, progress: Optional[ProgressCallback] = None,
+                  workers: int = 1) -> gpd.GeoDataFrame:
+    """
+    Box -> nearest road line (point-to-line distance, STRtree on the clipped roads).
+    nearest_road_x/y is the closest point on the road itself, in lon/lat.
+    """
+    main_xy = project_xy(main_centroid)
+    lines = road_lines.geometry.to_crs(PROJECTED_CRS).to_numpy()
+    dist_min, idx_min = nearest_line(main_centroid, road_lines, main_xy=main_xy, lines=lines,
+                                     max_bytes=max_bytes, progress=progress, label="box2road_line", workers=workers)
 
-    # Convert Euclidean degrees to approximate km
-    # (rough approximation: 1 degree ≈ 111 km at equator)
-    distances_km = distances * 111.0
+    # snap each box onto its nearest road (chunked, like the query) and bring the points back to lon/lat
+    snap_xy = np.empty_like(main_xy)
+
+    def snap_chunk(start, end):
+        nearest = shapely.shortest_line(shapely.points(main_xy[start:end]), lines[idx_min[start:end]])
+        snap_xy[start:end] = shapely.get_coordinates(shapely.get_point(nearest, 1))
+
+    map_chunks(snap_chunk, len(main_xy), chunk_size_for(_LINE_BYTES_PER_ROW, max_bytes, workers), workers)
+    snap_lon, snap_lat = Transformer.from_crs(PROJECTED_CRS, "EPSG:4326", always_xy=True).transform(
+        snap_xy[:, 0], snap_xy[:, 1])
 
-    # Build output
     out = main_centroid.copy()
-    out["nearest_road_id"] = secondary_centroid["road_id"].iloc[indices].to_numpy()
-    out["nearest_road_x"] = secondary_centroid["x"].iloc[indices].to_numpy()
-    out["nearest_road_y"] = secondary_centroid["y"].iloc[indices].to_numpy()
-    out["distance_km"] = distances_km
+    out["nearest_road_id"] = road_lines["road_id"].to_numpy()[idx_min]
+    out["nearest_road_x"] = snap_lon
+    out["nearest_road_y"] = snap_lat
+    out["distance_km"] = dist_min
+    out["score"] = minmax_score(dist_min)
 
-    # Compute score
-    dmin, dmax = distances_km.min(), distances_km.max()
-    out["score"] = 1.0 if dmax == dmin else 1.0 - (distances_km - dmin) / (dmax - dmin)
+    return out
+
+def box2plant(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame,
+              max_bytes: int = DEFAULT_MAX_BYTES, progress: Optional[ProgressCallback] = None,
+              workers: int = 1) -> gpd.GeoDataFrame:
+    # main: N boxes; secondary: M solar plants (farther from existing plants scores higher)
+    return box2target(main_centroid, secondary_centroid, id_col="solar_id", prefix="solar", invert=True,
+                      max_bytes=max_bytes, progress=progress, workers=workers)
+
+# ============================================================
+# Persistent spatial-index cache for static target layers
+# ============================================================
+
+INDEX_CACHE_VERSION = 1  # bump when the bundle layout below changes
+BUNDLE_GRACE_S = 3600    # stale bundles used within this many seconds are kept (another run may be reading them)
+
+def _write_atomic(path: Path, write):
+    """
+    write(file) into a temp file of its own next to path, then rename, so readers never
+    see half a bundle and concurrent writers of the same file never share a temp file.
+    """
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            tmp.unlink(missing_ok=True)
+            raise
+    os.replace(tmp, path)
+
+def _evict_bundles(cache_dir: Path, stem: str, source: str, keep: Path):
+    """
+    Remove the bundles of older versions of source: exactly <stem>-v<n>-<hash16>,
+    built from the same source path, and not used for BUNDLE_GRACE_S.
+    """
+    pattern = re.compile(rf"{re.escape(stem)}-v\d+-[0-9a-f]{{16}}")
+    now = time.time()
+    for old in cache_dir.iterdir():
+        if old == keep or not old.is_dir() or not pattern.fullmatch(old.name):
+            continue
+        marker = old / "source.txt"
+        try:
+            if marker.read_text() != source or now - marker.stat().st_mtime < BUNDLE_GRACE_S:
+                continue
+            shutil.rmtree(old)
+        except FileNotFoundError:  # unmarked bundle, or another run removed it first
+            continue
+
+def load_target_index(path, id_col: str, mode: str = "haversine", aggregates: bool = False,
+                      extra_cols: Iterable[str] = (), cache_dir=None, crs: str = PROJECTED_CRS,
+                      digest_dir=None) -> dict:
+    """
+    Load a target layer as packed arrays plus its prebuilt spatial index.
+
+    The first call parses the GeoJSON and writes a bundle to
+    cache_dir/<file stem>-v<version>-<sha256[:16]>/: one .npy per column
+    (memory-mapped on load) and the pickled trees / packed WKB lines.
+    Later calls on an unchanged file never touch the GeoJSON. Artefacts are
+    added to the bundle the first time a mode needs them, and bundles of older
+    versions of the same source path are removed once no run has used them
+    for BUNDLE_GRACE_S (see _evict_bundles).
+
+    Args:
+        path: target GeoJSON (DSO stations, solar centroids, stations, road lines)
+        id_col: id column kept in the returned table
+        mode: 'haversine' | 'projected' | 'line' | 'network', decides which index is loaded
+              ('network' targets are plain points, their graph comes from build_road_graph)
+        aggregates: also load the unit-sphere tree used by knn_radius_aggregates
+        extra_cols: further columns to keep, e.g. a weight_col
+        cache_dir: bundle directory; None builds everything in memory (no cache)
+        digest_dir: where file hashes are memoised (see file_digest); pass the build
+                    manifest's digest_dir so each target file is hashed once per change.
+                    Defaults to cache_dir.
+
+    Returns:
+        {'gdf': DataFrame (id_col, extra_cols, and x / y for point layers),
+         plus 'sphere_tree' / 'projected_tree' / 'lines' as needed},
+        ready to be merged into a box2feature layer config.
+    """
+    if mode not in ("haversine", "projected", "line", "network"):
+        raise ValueError(f"Unknown proximity mode {mode!r}, expected 'haversine', 'projected', 'line' or 'network'")
+    columns = [id_col, *extra_cols] + ([] if mode == "line" else ["x", "y"])
+
+    source = None
+    def read_source():
+        nonlocal source
+        if source is None:
+            source = read_geojson(path)
+        return source
+
+    if cache_dir is None:
+        bundle = None
+    else:
+        stem, source_path = Path(path).stem, str(Path(path).resolve())
+        bundle = Path(cache_dir) / f"{stem}-v{INDEX_CACHE_VERSION}-{file_digest(path, digest_dir or cache_dir)[:16]}"
+        bundle.mkdir(parents=True, exist_ok=True)
+        # the marker names the source path and its mtime is the last use of the bundle
+        _write_atomic(bundle / "source.txt", lambda fh: fh.write(source_path.encode()))
+        _evict_bundles(Path(cache_dir), stem, source_path, bundle)
+
+    def cached_array(name: str, build) -> np.ndarray:
+        if bundle is None:
+            return build()
+        f = bundle / f"{name}.npy"
+        if not f.exists():
+            arr = build()
+            _write_atomic(f, lambda fh: np.save(fh, arr, allow_pickle=False))
+        return np.load(f, mmap_mode="r")
+
+    def cached_object(name: str, build):
+        if bundle is None:
+            return build()
+        f = bundle / f"{name}.pkl"
+        if not f.exists():
+            obj = build()
+            _write_atomic(f, lambda fh: pickle.dump(obj, fh, protocol=pickle.HIGHEST_PROTOCOL))
+            return obj
+        with open(f, "rb") as fh:
+            return pickle.load(fh)
+
+    def packed_column(col: str) -> np.ndarray:
+        values = read_source()[col].to_numpy()
+        # object columns (string ids) become fixed-width unicode so they load without pickle
+        return values.astype(str) if values.dtype == object else values
+
+    table = pd.DataFrame({col: cached_array(f"col_{col}", lambda col=col: packed_column(col)) for col in columns})
+    out = {"gdf": table}
+
+    if mode == "haversine" or aggregates:
+        out["sphere_tree"] = cached_object("sphere_tree", lambda: build_sphere_tree(table))
+    if mode == "projected":
+        out["projected_tree"] = cached_object(f"projected_tree_{crs.replace(':', '')}",
+                                              lambda: cKDTree(project_xy(table, crs)))
+    if mode == "line":
+        # projected lines as one WKB byte buffer + offsets: no pickle, memory-mappable
+        tag = crs.replace(":", "")
+        wkb = []
+        def projected_wkb():
+            if not wkb:
+                wkb.extend(shapely.to_wkb(read_source().geometry.to_crs(crs).to_numpy()))
+            return wkb
+        buf = cached_array(f"lines_wkb_{tag}", lambda: np.frombuffer(b"".join(projected_wkb()), dtype=np.uint8))
+        offsets = cached_array(f"lines_offsets_{tag}",
+                               lambda: np.cumsum([0] + [len(w) for w in projected_wkb()], dtype=np.int64))
+        out["lines"] = shapely.from_wkb([buf[i:j].tobytes() for i, j in zip(offsets[:-1], offsets[1:])])
 
     return out
 
-def box2plant(main_centroid: gpd.GeoDataFrame, secondary_centroid: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    # main: N boxes; secondary: M DSOs
-    lat_g = main_centroid["y"].to_numpy()[:, None]  # (N,1)
-    lon_g = main_centroid["x"].to_numpy()[:, None]  # (N,1)
-    lat_s = secondary_centroid["y"].to_numpy()[None, :]  # (1,M)
-    lon_s = secondary_centroid["x"].to_numpy()[None, :]  # (1,M)
+def _index_kwargs(cfg: dict, mode: str) -> dict:
+    """Pick the prebuilt index (if load_target_index supplied one) that the mode's engine accepts."""
+    if mode == "network":
+        if cfg.get("network") is None:
+            raise ValueError("'network' mode needs the road graph: cfg['network'] = build_road_graph(road_lines)")
+        return {"network": cfg["network"]}
+    key = {"haversine": "sphere_tree", "projected": "projected_tree", "line": "lines"}.get(mode)
+    if key is None or cfg.get(key) is None:
+        return {}
+    return {"lines": cfg[key]} if mode == "line" else {"tree": cfg[key]}
 
-    D = haversine_vec(lat_g, lon_g, lat_s, lon_s)  # (N,M)
-    idx_min = np.argmin(D, axis=1)                # (N,)
-    dist_min = D[np.arange(D.shape[0]), idx_min]  # (N,)
+# ============================================================
+# Multi-layer proximity scoring (box2feature)
+# ============================================================
 
-    # prepare result (don’t mutate original)
-    out = main_centroid.copy()
-    out["nearest_solar_id"] = secondary_centroid["solar_id"].to_numpy()[idx_min]
-    # keep x=lon, y=lat (no swap!)
-    out["nearest_solar_x"]  = secondary_centroid["x"].to_numpy()[idx_min]
-    out["nearest_solar_y"]  = secondary_centroid["y"].to_numpy()[idx_min]
-    out["distance_km"]    = dist_min
+# Default target layers scored by dataScore in one pass.
+# direction: 'cost'    -> distance is a cost, closer boxes score higher
+#            'benefit' -> distance is a benefit, farther boxes score higher
+# mode:      'haversine' (default), 'projected' (EPSG:2180 KD-tree on points)
+#            or 'line' (STRtree point-to-line distance, used for the clipped road linestrings)
+#            or 'network' (travel distance on the road graph, needs 'network_path' to road lines)
+# decay:     {'fn': ..., **params} from DECAY_FUNCTIONS, see distance_score (omitted: region min-max)
+# optional aggregates (point layers only): 'k', 'radii_km', 'weight_col', see knn_radius_aggregates
+PROXIMITY_LAYERS = {
+    'dso':     {'id_col': 'dso_id',     'direction': 'cost', 'k': 3, 'radii_km': (5, 10, 20),
+                'decay': {'fn': 'logistic', 'midpoint_km': 10.0, 'width_km': 2.5}},
+    'solar':   {'id_col': 'solar_id',   'direction': 'benefit',
+                'decay': {'fn': 'exponential', 'scale_km': 2.0}},
+    'station': {'id_col': 'station_id', 'direction': 'cost',
+                'decay': {'fn': 'linear', 'cutoff_km': 25.0}},
+    'road':    {'id_col': 'road_id',    'direction': 'cost', 'mode': 'line',
+                'decay': {'fn': 'piecewise', 'thresholds_km': (0.5, 1.0, 2.0, 5.0), 'scores': (1.0, 0.8, 0.6, 0.3, 0.0)}},
+}
+
+def box2feature(main_centroid: gpd.GeoDataFrame, targets: dict, max_bytes: int = DEFAULT_MAX_BYTES,
+                progress: Optional[ProgressCallback] = None, dtype=np.float64, workers: int = 1) -> pd.DataFrame:
+    """
+    Score every box against several target layers in one pass.
+
+    Args:
+        main_centroid: N box centroids with box_id, x (lon), y (lat)
+        targets: {layer_name: {'gdf': GeoDataFrame, 'id_col': str, 'direction': 'cost'|'benefit',
+                               'mode': 'haversine'|'projected'|'line'|'network', 'decay': {...}}},
+                 optionally with the prebuilt 'sphere_tree' / 'projected_tree' / 'lines'
+                 returned by load_target_index; 'network' layers need 'network' (build_road_graph)
+        max_bytes: working-memory budget shared by every layer query (one layer runs at a time)
+        progress: optional callback progress(label, rows_done, rows_total)
+        dtype: np.float32 halves the size of the distance/score columns
+        workers: threads per layer query (<= 0: one per core); layers still run one after another
+
+    Returns:
+        Compact DataFrame: box_id, {layer}_distance_km, {layer}_score (no geometry),
+        plus k-NN / radius aggregate columns for layers that configure them
+    """
+    out = pd.DataFrame({"box_id": main_centroid["box_id"].to_numpy()})
+    main_xy = None  # projected box centroids, computed once for all 'projected'/'line'/'network' layers
+
+    for name, cfg in targets.items():
+        direction = cfg.get('direction', 'cost')
+        if direction not in ('cost', 'benefit'):
+            raise ValueError(f"Layer '{name}': direction must be 'cost' or 'benefit', got {direction!r}")
+        if cfg.get('decay') is not None and cfg['decay'].get('fn') not in DECAY_FUNCTIONS:
+            raise ValueError(f"Layer '{name}': unknown decay {cfg['decay'].get('fn')!r}")
+
+        mode = cfg.get('mode', 'haversine')
+        if mode in ('projected', 'line', 'network') and main_xy is None:
+            main_xy = project_xy(main_centroid)
+
+        dist_km, _ = nearest_target(main_centroid, cfg['gdf'], mode=mode, main_xy=main_xy,
+                                    max_bytes=max_bytes, progress=progress, label=name, dtype=dtype,
+                                    workers=workers, **_index_kwargs(cfg, mode))
+        out[f"{name}_distance_km"] = dist_km
+        out[f"{name}_score"] = distance_score(dist_km, cfg.get('decay'), direction).astype(dtype, copy=False)
+
+        if cfg.get('k') or cfg.get('radii_km'):
+            agg = knn_radius_aggregates(main_centroid, cfg['gdf'], prefix=name, k=cfg.get('k'),
+                                        radii_km=cfg.get('radii_km', ()), weight_col=cfg.get('weight_col'),
+                                        max_bytes=max_bytes, progress=progress, workers=workers,
+                                        tree=cfg.get('sphere_tree'))
+            for col in agg.columns:
+                out[col] = agg[col].to_numpy()
 
-    dmin, dmax = float(dist_min.min()), float(dist_min.max())
-    out["score"] = 1.0 if dmax == dmin else 1.0 - (dist_min - dmin) / (dmax - dmin)
-    out['score'] = 1- out["score"]
-    
     return out
 
 def convert_geojson(gdf, out_path):
@@ -291,11 +992,56 @@ def runner_PV_Box2Road(centroid_box_path, centroid_road_path, output_path):
     road_score = box2road_kdtree(box_gdf , road_gdf)
     convert_geojson(road_score, output_path)
 
+def runner_PV_Box2RoadLine(centroid_box_path, road_lines_path, output_path):
+    box_gdf = read_geojson(centroid_box_path)
+    road_gdf = read_geojson(road_lines_path)
+    road_score = box2road_line(box_gdf , road_gdf)
+    convert_geojson(road_score, output_path)
+
 def runner_PV_Box2Plant(centroid_box_path, centroid_plant_path,output_path): #source_name
     box_gdf = read_geojson(centroid_box_path)
     plant_gdf = read_geojson(centroid_plant_path)# power_plant_filter(centroid_plant_path, source_name)
     plant_score =  box2plant(box_gdf , plant_gdf)
     convert_geojson(plant_score, output_path)
+
+def runner_PV_Box2Feature(centroid_box_path, layers: dict, output_path, max_bytes: int = DEFAULT_MAX_BYTES,
+                          progress: Optional[ProgressCallback] = None, workers: int = 1, index_cache_dir=None,
+                          digest_dir=None):
+    """
+    Read the box centroids once, score all target layers and write one table.
+
+    layers: {layer_name: {'path': ..., 'id_col': ..., 'direction': 'cost'|'benefit'}}
+    'network' layers also give 'network_path' (road lines); each road file is turned
+    into a graph once and shared by all layers routed on it.
+    Layers whose file is missing are skipped with a warning.
+    index_cache_dir: load target layers through load_target_index, so unchanged
+    target files are read from the on-disk index bundle instead of the GeoJSON;
+    digest_dir: file-hash memo shared with the build manifest (see load_target_index).
+    """
+    box_gdf = read_artefact(centroid_box_path, columns=["box_id", "x", "y"])
+
+    targets = {}
+    graphs = {}
+    for name, cfg in layers.items():
+        missing = [p for p in (cfg['path'], cfg.get('network_path')) if p is not None and not Path(p).exists()]
+        if missing:
+            print(f"Warning: File missing for layer '{name}' -> {missing[0]}")
+            continue
+        if cfg.get('mode') == 'network':
+            if cfg['network_path'] not in graphs:
+                graphs[cfg['network_path']] = build_road_graph(read_geojson(cfg['network_path']))
+            cfg = {**cfg, 'network': graphs[cfg['network_path']]}
+        if index_cache_dir is None:
+            targets[name] = {**cfg, 'gdf': read_geojson(cfg['path'])}
+        else:
+            extra_cols = [cfg['weight_col']] if cfg.get('weight_col') else []
+            targets[name] = {**cfg, **load_target_index(cfg['path'], cfg['id_col'], mode=cfg.get('mode', 'haversine'),
+                                                        aggregates=bool(cfg.get('k') or cfg.get('radii_km')),
+                                                        extra_cols=extra_cols, cache_dir=index_cache_dir,
+                                                        digest_dir=digest_dir)}
+
+    proximity_score = box2feature(box_gdf, targets, max_bytes=max_bytes, progress=progress, workers=workers)
+    write_artefact(proximity_score, output_path)
     
 # def runner_PV_Box2DsoMocy(centroid_box_path, centroid_dso_path, output_path):
 #     box_gdf = read_geojson(centroid_box_path)
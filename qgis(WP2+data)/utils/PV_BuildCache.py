@@ -0,0 +1,137 @@
+import os
+import json
+import types
+import inspect
+import hashlib
+from pathlib import Path
+from typing import Iterable, Optional
+
+
+# ============================================================
+# Content-hash build cache for the pipeline steps
+# ============================================================
+
+BUILD_CACHE_VERSION = 1  # bump when the fingerprint layout below changes
+
+def file_digest(path, cache_dir=None) -> str:
+    """
+    sha256 of the file content. With cache_dir the digest is remembered per
+    (path, size, mtime) in cache_dir/digests/<sha1(path)[:16]>.json, so unchanged
+    files are not re-read. One small memo per file, replaced atomically (per-process
+    temp file + os.replace): concurrent regions never rewrite each other's entries.
+    """
+    p = Path(path).resolve()
+    stat = p.stat()
+    stamp = [stat.st_size, stat.st_mtime_ns]
+
+    memo = None
+    if cache_dir is not None:
+        memo = Path(cache_dir) / "digests" / f"{hashlib.sha1(str(p).encode()).hexdigest()[:16]}.json"
+        try:
+            entry = json.loads(memo.read_text())
+        except (FileNotFoundError, ValueError):  # not memoised yet, or unreadable: recompute
+            entry = None
+        if entry and entry[:3] == [str(p)] + stamp:
+            return entry[3]
+
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for block in iter(lambda: f.read(1024 ** 2), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    if memo is not None:
+        memo.parent.mkdir(parents=True, exist_ok=True)
+        tmp = memo.with_name(f"{memo.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps([str(p)] + stamp + [digest]))
+        os.replace(tmp, memo)
+    return digest
+
+def code_digest(*objects) -> str:
+    """sha256 of the code a step runs: whole source file for modules, source text for classes / functions."""
+    h = hashlib.sha256()
+    for obj in objects:
+        if isinstance(obj, types.ModuleType):
+            h.update(Path(obj.__file__).read_bytes())
+        else:
+            h.update(inspect.getsource(obj).encode())
+    return h.hexdigest()
+
+def shapefile_parts(path) -> list:
+    """A .shp plus its sidecars (.dbf holds the attributes, e.g. fclass), all of which are step inputs."""
+    p = Path(path)
+    return [p] + [p.with_suffix(s) for s in (".shx", ".dbf", ".prj", ".cpg")]
+
+def _plain(params: dict) -> dict:
+    """params as plain JSON values (tuples -> lists, paths -> str), so they compare equal after a reload."""
+    return json.loads(json.dumps(params, sort_keys=True, default=str))
+
+class BuildManifest:
+    """
+    Fingerprints of the pipeline steps of one region, kept in a JSON manifest.
+
+    A fingerprint covers the content hashes of the step's input files, its
+    parameters and the hash of its code. A step reruns when its fingerprint
+    differs from the recorded one or one of its outputs is missing. Later steps
+    list the outputs of earlier ones as inputs, so a rerun that changes an
+    output invalidates everything downstream, and one that writes the same
+    content invalidates nothing.
+
+    Usage (per step):
+        if manifest.is_stale("2", outputs, inputs, params, code):
+            ...run the step...
+            manifest.record("2")
+    """
+
+    def __init__(self, path, digest_dir=None):
+        self.path = Path(path)
+        self.digest_dir = digest_dir
+        self.steps = json.loads(self.path.read_text())["steps"] if self.path.exists() else {}
+        self._pending = {}
+
+    def fingerprint(self, outputs: Iterable, inputs: Iterable, params: Optional[dict] = None, code=()) -> dict:
+        return {
+            "version": BUILD_CACHE_VERSION,
+            "inputs": {str(p): file_digest(p, self.digest_dir) if Path(p).is_file() else None for p in inputs},
+            "params": _plain(params or {}),
+            "code": code_digest(*code),
+            "outputs": [str(p) for p in outputs],
+        }
+
+    def changes(self, step_id: str, entry: dict) -> list:
+        """What differs between entry and the recorded fingerprint of step_id (empty: up to date)."""
+        old = self.steps.get(step_id)
+        if old is None:
+            return ["no recorded run"]
+        if old.get("version") != entry["version"]:
+            return ["build cache version"]
+        changed = [f"input {Path(p).name}" for p in sorted(set(old["inputs"]) | set(entry["inputs"]))
+                   if old["inputs"].get(p) != entry["inputs"].get(p)]
+        changed += [f"param {k}" for k in sorted(set(old["params"]) | set(entry["params"]))
+                    if old["params"].get(k) != entry["params"].get(k)]
+        if old["code"] != entry["code"]:
+            changed.append("code")
+        if old["outputs"] != entry["outputs"]:
+            changed.append("outputs")
+        changed += [f"missing {Path(p).name}" for p in entry["outputs"] if not Path(p).exists()]
+        return changed
+
+    def is_stale(self, step_id: str, outputs: Iterable, inputs: Iterable, params: Optional[dict] = None,
+                 code=(), force: bool = False) -> bool:
+        """True when step_id has to run; its fingerprint is kept until record(step_id)."""
+        entry = self.fingerprint(outputs, inputs, params, code)
+        self._pending[step_id] = entry
+        changed = ["--force"] if force else self.changes(step_id, entry)
+        if changed:
+            print(f"Step {step_id}: rerun ({', '.join(changed)})")
+        else:
+            print(f"Step {step_id}: up to date, skipped")
+        return bool(changed)
+
+    def record(self, step_id: str):
+        """Store the fingerprint of a finished step (written atomically, a failed step is never recorded)."""
+        self.steps[step_id] = self._pending.pop(step_id)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"version": BUILD_CACHE_VERSION, "steps": self.steps}, indent=1, sort_keys=True))
+        os.replace(tmp, self.path)
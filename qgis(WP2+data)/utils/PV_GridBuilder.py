@@ -0,0 +1,492 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from dataclasses import dataclass, field
+from typing import Optional
+from pathlib import Path
+from pyproj import Transformer
+
+from utils.PV_ArtefactIO import read_artefact, write_artefact
+
+
+# ============================================================
+# Box grid over a region (QGIS-free replacement of the PV_CreateGrid model)
+# ============================================================
+
+_BLOCK_CELLS = 32  # cells per side of the coarse blocks used to skip far-inside / far-outside areas
+MIN_COVERAGE = 1e-9  # cells covering less of their area are floating-point slivers of the boundary, dropped
+
+def read_region(input_path, crs: str = "EPSG:2180") -> shapely.Geometry:
+    """Region boundary (e.g. fixGeometries_{region}.geojson) as one geometry in the grid CRS."""
+    p = Path(input_path)
+    if not p.exists():
+        raise FileNotFoundError(f"File not found: {p.resolve()}")
+    region = gpd.read_file(p)
+    if region.crs is None:
+        region = region.set_crs(4326)
+    return shapely.make_valid(region.to_crs(crs).geometry.union_all())
+
+def grid_lattice(bounds, h_space: float, v_space: float, origin=None):
+    """
+    Rectangular lattice covering bounds (minx, miny, maxx, maxy), anchored at the
+    top-left corner like native:creategrid, or snapped to an existing lattice
+    origin (x, y) so the cells nest inside the cells of a coarser grid.
+
+    Returns:
+        left: (n_cols,) cell left edges, top: (n_rows,) cell top edges
+    """
+    minx, miny, maxx, maxy = bounds
+    if origin is not None:
+        minx = origin[0] + h_space * np.floor((minx - origin[0]) / h_space)
+        maxy = origin[1] - v_space * np.floor((origin[1] - maxy) / v_space)
+    n_cols = max(1, int(np.ceil((maxx - minx) / h_space)))
+    n_rows = max(1, int(np.ceil((maxy - miny) / v_space)))
+    return minx + h_space * np.arange(n_cols), maxy - v_space * np.arange(n_rows)
+
+def _classify_blocks(region, left, top, h_space, v_space, block):
+    """
+    Split the lattice into block x block tiles and classify each against the
+    prepared region -> (inside, touching) boolean (n_block_rows, n_block_cols) arrays.
+    """
+    bx = left[::block]
+    by = top[::block]
+    x0 = np.repeat(bx[None, :], len(by), axis=0)
+    y1 = np.repeat(by[:, None], len(bx), axis=1)
+    x1 = np.minimum(x0 + block * h_space, left[-1] + h_space)
+    y0 = np.maximum(y1 - block * v_space, top[-1] - v_space)
+    tiles = shapely.box(x0, y0, x1, y1)
+    return shapely.contains_properly(region, tiles), shapely.intersects(region, tiles)
+
+@dataclass
+class BoxGrid:
+    """
+    Geometry-free box grid: lattice origin (top-left corner), cell size and CRS,
+    plus one int32 row / col and a float32 coverage per kept cell.
+
+    coverage is the fraction of the cell inside the region (1.0 for interior
+    cells, < 1 for clipped boundary cells), i.e. the clip mask with its area.
+    edge_geoms holds the clipped polygons of the boundary cells only (coverage < 1,
+    in cell order), so the grid stays exact without the region. box_id, bounds,
+    centres, areas, pixel labels and polygons are all derived on demand, so a
+    5M-box grid is ~60 MB of arrays instead of 5M polygons.
+    """
+    origin_x: float
+    origin_y: float
+    h_space: float
+    v_space: float
+    n_rows: int
+    n_cols: int
+    crs: str
+    row: np.ndarray       # int32
+    col: np.ndarray       # int32
+    coverage: np.ndarray  # float32
+    edge_geoms: Optional[np.ndarray] = None  # clipped polygons of the cells with coverage < 1
+    _lookup: Optional[np.ndarray] = field(default=None, init=False, repr=False)
+
+    def __len__(self):
+        return len(self.row)
+
+    @property
+    def box_id(self) -> np.ndarray:
+        """1-based ids, column by column from the top-left cell (same numbering as the GeoJSON grid)."""
+        return self.col.astype(np.int64) * self.n_rows + self.row + 1
+
+    @property
+    def area(self) -> np.ndarray:
+        return self.coverage.astype(np.float64) * (self.h_space * self.v_space)
+
+    def bounds(self):
+        """(minx, miny, maxx, maxy) arrays of the full (unclipped) cells."""
+        minx = self.origin_x + self.col * self.h_space
+        maxy = self.origin_y - self.row * self.v_space
+        return minx, maxy - self.v_space, minx + self.h_space, maxy
+
+    def centres(self, crs: Optional[str] = None):
+        """Cell centres as (x, y) arrays, in the grid CRS or reprojected to crs."""
+        x = self.origin_x + (self.col + 0.5) * self.h_space
+        y = self.origin_y - (self.row + 0.5) * self.v_space
+        if crs is None:
+            return x, y
+        return Transformer.from_crs(self.crs, crs, always_xy=True).transform(x, y)
+
+    def centroid_table(self, crs: str = "EPSG:4326") -> pd.DataFrame:
+        """
+        box_id, x, y of the cell centroids in crs (proximity input). Interior cells use
+        the lattice centre; boundary cells the centroid of the first part of their
+        clipped polygon, the same points box_centroids takes from the polygon layer.
+        """
+        x, y = self.centres()
+        if self.edge_geoms is not None:
+            edge = np.flatnonzero(self.coverage < 1.0)
+            first = shapely.centroid(shapely.get_geometry(self.edge_geoms, 0))
+            x[edge], y[edge] = shapely.get_x(first), shapely.get_y(first)
+        x, y = Transformer.from_crs(self.crs, crs, always_xy=True).transform(x, y)
+        return pd.DataFrame({"box_id": self.box_id, "x": x, "y": y})
+
+    def locate(self, x, y) -> np.ndarray:
+        """
+        Positions (into row / col) of the kept cells containing the points (x, y)
+        in the grid CRS, -1 for points outside the grid. Pure index arithmetic.
+        """
+        col = np.floor((np.asarray(x) - self.origin_x) / self.h_space).astype(np.int64)
+        row = np.floor((self.origin_y - np.asarray(y)) / self.v_space).astype(np.int64)
+        inside = (row >= 0) & (row < self.n_rows) & (col >= 0) & (col < self.n_cols)
+        if self._lookup is None:
+            # lattice cell -> kept position, built once per grid (int32: 4 bytes per lattice cell)
+            self._lookup = np.full(self.n_rows * self.n_cols, -1, dtype=np.int32)
+            self._lookup[self.col.astype(np.int64) * self.n_rows + self.row] = np.arange(len(self), dtype=np.int32)
+        return np.where(inside, self._lookup[np.where(inside, col * self.n_rows + row, 0)], -1).astype(np.int64)
+
+    def label_points(self, x, y) -> np.ndarray:
+        """
+        Like locate, but points in a boundary cell only count when they lie inside its
+        clipped polygon (edge_geoms), i.e. the cell that holds a pixel centre under the
+        centre rule of label_array, from row / col arithmetic instead of rasterisation.
+        """
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        pos = self.locate(x, y)
+        if self.edge_geoms is None:
+            return pos
+        edge_cells = np.flatnonzero(self.coverage < 1.0)
+        on_edge = np.flatnonzero(pos >= 0)
+        on_edge = on_edge[self.coverage[pos[on_edge]] < 1.0]
+        if on_edge.size:
+            geoms = self.edge_geoms[np.searchsorted(edge_cells, pos[on_edge])]
+            outside = ~shapely.contains_xy(geoms, x[on_edge], y[on_edge])
+            pos[on_edge[outside]] = -1
+        return pos
+
+    def polygons(self, region=None) -> np.ndarray:
+        """Cell polygons, built now; boundary cells are clipped to region, or take the stored edge_geoms."""
+        geoms = shapely.box(*self.bounds())
+        edge = self.coverage < 1.0
+        if region is not None:
+            geoms[edge] = shapely.intersection(geoms[edge], region)
+        elif self.edge_geoms is not None:
+            geoms[edge] = self.edge_geoms
+        return geoms
+
+    def to_geodataframe(self, region=None, region_name: str = "") -> gpd.GeoDataFrame:
+        """Materialise the grid as the box_id / area / perimeter / region_name polygon layer."""
+        geometry = self.polygons(region)
+        perimeter = np.full(len(self), 2.0 * (self.h_space + self.v_space))
+        if region is not None or self.edge_geoms is not None:
+            edge = self.coverage < 1.0
+            perimeter[edge] = shapely.length(geometry[edge])
+        return gpd.GeoDataFrame({
+            "box_id": self.box_id,
+            "area": self.area,
+            "perimeter": perimeter,
+            "region_name": region_name,
+        }, geometry=geometry, crs=self.crs)
+
+    def save(self, path):
+        """Store the grid as a small .npz (arrays + lattice parameters, edge polygons as one WKB buffer)."""
+        edge = {}
+        if self.edge_geoms is not None:
+            wkb = shapely.to_wkb(self.edge_geoms)
+            edge = {"edge_wkb": np.frombuffer(b"".join(wkb), dtype=np.uint8),
+                    "edge_offsets": np.cumsum([0] + [len(w) for w in wkb], dtype=np.int64)}
+        np.savez(path, row=self.row, col=self.col, coverage=self.coverage,
+                 lattice=np.array([self.origin_x, self.origin_y, self.h_space, self.v_space,
+                                   self.n_rows, self.n_cols], dtype=np.float64),
+                 crs=np.array(self.crs), **edge)
+
+    @classmethod
+    def load(cls, path) -> "BoxGrid":
+        with np.load(path) as z:
+            ox, oy, h, v, n_rows, n_cols = z["lattice"]
+            edge_geoms = None
+            if "edge_wkb" in z:
+                buf, offsets = z["edge_wkb"], z["edge_offsets"]
+                edge_geoms = shapely.from_wkb([buf[i:j].tobytes() for i, j in zip(offsets[:-1], offsets[1:])])
+            return cls(ox, oy, h, v, int(n_rows), int(n_cols), str(z["crs"]),
+                       z["row"], z["col"], z["coverage"], edge_geoms)
+
+def build_box_grid(region, h_space: float, v_space: float, crs: str = "EPSG:2180", origin=None) -> BoxGrid:
+    """
+    Implicit box grid of the cells intersecting the region, computed with NumPy + vectorized shapely.
+
+    The lattice is first tested in coarse blocks against the prepared region:
+    blocks strictly inside keep all their cells without any per-cell predicate,
+    blocks outside are dropped, and only cells of boundary blocks are tested and
+    clipped (to measure their coverage).
+
+    Args:
+        region: region geometry in crs (see read_region)
+        h_space / v_space: cell width / height in CRS units (metres for EPSG:2180)
+        crs: grid CRS
+        origin: snap the lattice to this (x, y) corner, e.g. BoxGrid.origin_x / origin_y of a coarser grid
+    """
+    shapely.prepare(region)
+    left, top = grid_lattice(region.bounds, h_space, v_space, origin)
+    n_rows, n_cols = len(top), len(left)
+
+    inside_blocks, touching_blocks = _classify_blocks(region, left, top, h_space, v_space, _BLOCK_CELLS)
+
+    # column-major cell order: linear id = col * n_rows + row
+    cols, rows = np.divmod(np.arange(n_rows * n_cols, dtype=np.int64), n_rows)
+    br, bc = rows // _BLOCK_CELLS, cols // _BLOCK_CELLS
+    coverage = inside_blocks[br, bc].astype(np.float32)
+    candidate = touching_blocks[br, bc] & (coverage == 0)
+
+    # per-cell test only on boundary blocks
+    cand_idx = np.flatnonzero(candidate)
+    cand_boxes = shapely.box(left[cols[cand_idx]], top[rows[cand_idx]] - v_space,
+                             left[cols[cand_idx]] + h_space, top[rows[cand_idx]])
+    cell_inside = shapely.contains_properly(region, cand_boxes)
+    coverage[cand_idx[cell_inside]] = 1.0
+
+    edge = ~cell_inside & shapely.intersects(region, cand_boxes)
+    clipped = shapely.intersection(cand_boxes[edge], region)
+    coverage[cand_idx[edge]] = np.minimum(shapely.area(clipped) / (h_space * v_space), np.nextafter(np.float32(1), 0))
+
+    # cells that only touch the boundary (coverage 0 or rounding noise) are dropped
+    kept = np.flatnonzero(coverage > MIN_COVERAGE)
+    # clipped polygons of the kept boundary cells, in cell order
+    kept_edge = kept[coverage[kept] < 1.0]
+    edge_geoms = clipped[np.searchsorted(cand_idx[edge], kept_edge)]
+    return BoxGrid(float(left[0]), float(top[0]), h_space, v_space, n_rows, n_cols, crs,
+                   rows[kept].astype(np.int32), cols[kept].astype(np.int32), coverage[kept], edge_geoms)
+
+def build_grid(region, h_space: float, v_space: float, region_name: str = "",
+               crs: str = "EPSG:2180", origin=None) -> gpd.GeoDataFrame:
+    """
+    Box grid clipped to the region as a polygon layer (build_box_grid + to_geodataframe).
+
+    Returns:
+        GeoDataFrame in crs with box_id (1.., column by column from the top-left cell),
+        area, perimeter, region_name and the (clipped) cell polygon.
+    """
+    return build_box_grid(region, h_space, v_space, crs, origin).to_geodataframe(region, region_name)
+
+def runner_PvCreateGrid(input_path, create_grid_result_path, h_space: float, v_space: float, region_name,
+                        crs: str = "EPSG:2180", box_grid_path=None, origin=None):
+    """Write the polygon grid artefact (format from the suffix); box_grid_path also stores the implicit BoxGrid (.npz)."""
+    region = read_region(input_path, crs)
+    box_grid = build_box_grid(region, h_space, v_space, crs, origin)
+    if box_grid_path is not None:
+        Path(box_grid_path).parent.mkdir(parents=True, exist_ok=True)
+        box_grid.save(box_grid_path)
+
+    grid = box_grid.to_geodataframe(region, region_name)
+    write_artefact(grid, create_grid_result_path)
+    print(f"Success: Saved {len(grid)} boxes to {create_grid_result_path}")
+
+def box_centroids(grid_gdf: gpd.GeoDataFrame, crs: str = "EPSG:4326") -> gpd.GeoDataFrame:
+    """
+    One centroid per box in crs with its x / y columns and all box attributes.
+    Multi-part boundary cells keep the centroid of their first part, like the former
+    native:centroids (all parts) + removeduplicatesbyattribute(box_id) model.
+    """
+    first_part = shapely.get_geometry(grid_gdf.geometry.to_numpy(), 0)
+    centroids = gpd.GeoSeries(shapely.centroid(first_part), crs=grid_gdf.crs).to_crs(crs)
+    out = gpd.GeoDataFrame(grid_gdf.drop(columns=grid_gdf.geometry.name), geometry=centroids.to_numpy(), crs=crs)
+    out["x"] = centroids.x.to_numpy()
+    out["y"] = centroids.y.to_numpy()
+    return out
+
+def runner_PvCreateCentroid(input_path, centroid_result, crs: str = "EPSG:4326"):
+    """
+    Box centroid table (box_id, x, y; no geometry) for the proximity step. From a
+    BoxGrid .npz the points come from row / col arithmetic, otherwise (hex grids,
+    older runs) from the polygon artefact.
+    """
+    if Path(input_path).suffix == ".npz":
+        centroids = BoxGrid.load(input_path).centroid_table(crs)
+    else:
+        centroids = pd.DataFrame(box_centroids(read_artefact(input_path, columns=["box_id", "geometry"]), crs)[
+            ["box_id", "x", "y"]])
+    write_artefact(centroids, centroid_result)
+    print(f"Created Centroid is Completed {centroid_result}")
+
+# ============================================================
+# Hierarchical hexagonal grid (integer cell ids)
+# ============================================================
+
+# Pointy-top hexagons on a fixed EPSG:2180 lattice (origin 0, 0), so ids are stable
+# across regions. Each resolution halves the edge length (aperture 4): a parent
+# covers its centre child plus 3 of the 6 ring children, assigned by rounding
+# the child centre into the parent lattice, like H3's centre-containment rule.
+# Ancestors further up are defined one level at a time (parent of the parent),
+# so the hierarchy is a tree: every cell has exactly one ancestor per level.
+HEX_EDGE_RES0 = 65536.0  # edge length at resolution 0 in metres -> res 6: 1024 m, res 8: 256 m
+HEX_MAX_RES = 15
+
+# 4 bits resolution + 2 x 24 bits axial q / r: ids stay below 2**52, so they survive JSON / JavaScript doubles
+_HEX_AXIS_BITS = 24
+_HEX_AXIS_OFFSET = 1 << (_HEX_AXIS_BITS - 1)
+_HEX_AXIS_MASK = (1 << _HEX_AXIS_BITS) - 1
+_SQRT3 = np.sqrt(3.0)
+# axial direction vectors of the 6 neighbours
+_HEX_DIRECTIONS = np.array([(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)], dtype=np.int64)
+
+def hex_edge(res: int) -> float:
+    """Edge length (= circumradius) of a hexagon at res, in metres."""
+    return HEX_EDGE_RES0 / 2 ** res
+
+def hex_resolution_for(spacing_m: float) -> int:
+    """Finest resolution whose hexagon area is at least that of a spacing_m x spacing_m box."""
+    edge = np.sqrt(spacing_m ** 2 / (1.5 * _SQRT3))
+    return int(np.clip(np.floor(np.log2(HEX_EDGE_RES0 / edge)), 0, HEX_MAX_RES))
+
+def hex_encode(q, r, res: int) -> np.ndarray:
+    """Pack (resolution, axial q, axial r) into one positive int64 id."""
+    q = np.asarray(q, dtype=np.int64) + _HEX_AXIS_OFFSET
+    r = np.asarray(r, dtype=np.int64) + _HEX_AXIS_OFFSET
+    return (np.int64(res) << (2 * _HEX_AXIS_BITS)) | (q << _HEX_AXIS_BITS) | r
+
+def hex_decode(ids):
+    """Inverse of hex_encode -> (q, r, res) int64 arrays."""
+    ids = np.asarray(ids, dtype=np.int64)
+    res = ids >> (2 * _HEX_AXIS_BITS)
+    q = ((ids >> _HEX_AXIS_BITS) & _HEX_AXIS_MASK) - _HEX_AXIS_OFFSET
+    r = (ids & _HEX_AXIS_MASK) - _HEX_AXIS_OFFSET
+    return q, r, res
+
+def _hex_round(qf, rf):
+    """
+    Round fractional axial coordinates to the containing hexagon (cube rounding).
+    A tiny fixed nudge breaks ties on shared edges the same way everywhere, so
+    every parent gets exactly 4 children.
+    """
+    qf = np.asarray(qf, dtype=np.float64) + 1e-7
+    rf = np.asarray(rf, dtype=np.float64) + 2e-7
+    sf = -qf - rf
+    q, r, s = np.floor(qf + 0.5), np.floor(rf + 0.5), np.floor(sf + 0.5)
+    dq, dr, ds = np.abs(q - qf), np.abs(r - rf), np.abs(s - sf)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+def hex_from_xy(x, y, res: int) -> np.ndarray:
+    """Ids of the hexagons containing the points (x, y) in EPSG:2180."""
+    edge = hex_edge(res)
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    return hex_encode(*_hex_round((_SQRT3 / 3 * x - y / 3) / edge, (2 / 3 * y) / edge), res)
+
+def hex_centre(ids):
+    """Hexagon centres as (x, y) arrays in EPSG:2180."""
+    q, r, res = hex_decode(ids)
+    edge = HEX_EDGE_RES0 / 2.0 ** res
+    return edge * _SQRT3 * (q + r / 2), edge * 1.5 * r
+
+def hex_polygons(ids) -> np.ndarray:
+    """Hexagon polygons in EPSG:2180 (built on demand, like BoxGrid.polygons)."""
+    x, y = hex_centre(ids)
+    edge = HEX_EDGE_RES0 / 2.0 ** hex_decode(ids)[2]
+    angles = np.radians(30 + 60 * np.arange(6))
+    ring = np.stack([x[:, None] + edge[:, None] * np.cos(angles), y[:, None] + edge[:, None] * np.sin(angles)], axis=-1)
+    return shapely.polygons(np.concatenate([ring, ring[:, :1]], axis=1))
+
+def hex_parent(ids, parent_res: Optional[int] = None) -> np.ndarray:
+    """
+    Parent ids at parent_res (default: one level up). One level up is the
+    parent-resolution cell containing the cell centre; several levels up repeat
+    that step, so hex_parent(ids, res - 2) == hex_parent(hex_parent(ids)).
+    O(levels) per id, exact on the axial coordinates.
+    """
+    q, r, res = (np.array(v) for v in hex_decode(ids))
+    parent_res = res - 1 if parent_res is None else np.full_like(res, parent_res)
+    if np.any(parent_res < 0) or np.any(parent_res > res):
+        raise ValueError("parent_res must be between 0 and the cell resolution")
+    # same orientation, edge x 2 per level -> child axial / 2 is the fractional parent position
+    levels = res - parent_res
+    for level in range(int(levels.max(initial=0))):
+        up = levels > level
+        q[up], r[up] = _hex_round(q[up] / 2.0, r[up] / 2.0)
+    return hex_encode(q, r, 0) | (parent_res << (2 * _HEX_AXIS_BITS))
+
+def hex_children(cell_id, child_res: Optional[int] = None) -> np.ndarray:
+    """
+    Descendants of one cell at child_res (default: the next resolution, i.e. the
+    centre child + 3 ring children), the exact inverse of hex_parent: the cells
+    whose parent at the cell's resolution is cell_id.
+    """
+    q, r, res = (int(v) for v in hex_decode(cell_id))
+    child_res = res + 1 if child_res is None else child_res
+    if child_res < res or child_res > HEX_MAX_RES:
+        raise ValueError(f"child_res must be between the cell resolution and {HEX_MAX_RES}")
+    ids = np.atleast_1d(hex_encode(q, r, res))
+    for level in range(res, child_res):
+        cq, cr, _ = hex_decode(ids)
+        cand = (np.vstack([[0, 0], _HEX_DIRECTIONS])[None] + np.stack([2 * cq, 2 * cr], axis=-1)[:, None]).reshape(-1, 2)
+        cand = hex_encode(cand[:, 0], cand[:, 1], level + 1)
+        ids = cand[hex_parent(cand) == np.repeat(ids, 7)]
+    return ids
+
+def hex_k_ring(ids, k: int = 1) -> np.ndarray:
+    """
+    All cells within grid distance k of each id -> (N, 3k(k+1)+1) ids, the cell itself first.
+    Pure axial arithmetic, no geometry.
+    """
+    q, r, res = hex_decode(np.atleast_1d(ids))
+    offsets = [(dq, dr) for dq in range(-k, k + 1) for dr in range(max(-k, -dq - k), min(k, -dq + k) + 1)]
+    offsets.sort(key=lambda o: (max(abs(o[0]), abs(o[1]), abs(o[0] + o[1])), o))
+    dq, dr = np.array(offsets, dtype=np.int64).T
+    return hex_encode(q[:, None] + dq, r[:, None] + dr, 0) | (res[:, None] << (2 * _HEX_AXIS_BITS))
+
+def hex_aggregate(df, value_cols, parent_res: int, id_col: str = "box_id", weight_col: Optional[str] = None):
+    """
+    Aggregate per-cell values to parent cells (weighted mean, e.g. by 'area').
+    With weight_col the summed weights are kept in that column, so aggregating
+    level by level gives the same result as one step to parent_res.
+    """
+    parent = hex_parent(df[id_col].to_numpy(), parent_res)
+    weights = df[weight_col].to_numpy() if weight_col else np.ones(len(df))
+    grouped = df[value_cols].mul(weights, axis=0).groupby(parent)
+    total = pd.Series(weights).groupby(parent).sum()
+    out = grouped.sum().div(total.to_numpy(), axis=0)
+    if weight_col:
+        out[weight_col] = total.to_numpy()
+    return out.rename_axis(id_col).reset_index()
+
+def build_hex_grid(region, res: int, region_name: str = "", crs: str = "EPSG:2180") -> gpd.GeoDataFrame:
+    """
+    Hexagonal grid clipped to the region, with the same columns as build_grid
+    (box_id = hex id, area, perimeter, region_name), so every later step
+    (centroids, proximity, zonal, land ratio, final_score) works on it unchanged.
+    """
+    if crs != "EPSG:2180":
+        raise ValueError("The hexagonal lattice is defined in EPSG:2180")
+    shapely.prepare(region)
+    edge = hex_edge(res)
+    minx, miny, maxx, maxy = region.bounds
+
+    # every lattice row touching the bounds, each with the q range covering [minx, maxx]
+    r_lo, r_hi = int(np.floor((miny - edge) / (1.5 * edge))), int(np.ceil((maxy + edge) / (1.5 * edge)))
+    rows = np.arange(r_lo, r_hi + 1)
+    q_lo = np.floor((minx - edge) / (_SQRT3 * edge) - rows / 2).astype(np.int64)
+    q_hi = np.ceil((maxx + edge) / (_SQRT3 * edge) - rows / 2).astype(np.int64)
+    counts = q_hi - q_lo + 1
+    r = np.repeat(rows, counts)
+    q = np.repeat(q_lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    ids = hex_encode(q, r, res)
+    cells = hex_polygons(ids)
+    touching = shapely.intersects(region, cells)
+    ids, cells = ids[touching], cells[touching]
+
+    edge_cells = ~shapely.contains_properly(region, cells)
+    cells[edge_cells] = shapely.intersection(cells[edge_cells], region)
+    area = shapely.area(cells)
+    full_area = 1.5 * _SQRT3 * edge ** 2
+    keep = area > MIN_COVERAGE * full_area
+
+    area = np.where(edge_cells, area, full_area)
+    perimeter = np.where(edge_cells, shapely.length(cells), 6 * edge)
+    return gpd.GeoDataFrame({
+        "box_id": ids[keep],
+        "area": area[keep],
+        "perimeter": perimeter[keep],
+        "region_name": region_name,
+    }, geometry=cells[keep], crs=crs)
+
+def runner_PvCreateHexGrid(input_path, create_grid_result_path, res: int, region_name, crs: str = "EPSG:2180"):
+    region = read_region(input_path, crs)
+    grid = build_hex_grid(region, res, region_name=region_name, crs=crs)
+    write_artefact(grid, create_grid_result_path)
+    print(f"Success: Saved {len(grid)} hexagons (res {res}) to {create_grid_result_path}")
@@ -0,0 +1,73 @@
+import argparse
+import time
+
+import numpy as np
+import geopandas as gpd
+
+from scipy.spatial import cKDTree
+
+from utils.PV_BoxCentroidScore import nearest_target, build_sphere_tree, project_xy, DEFAULT_MAX_BYTES
+
+
+# ============================================================
+# Parallel proximity benchmark, run from qgis(WP2+data):
+#   python -m utils.PV_ProximityBenchmark --boxes 1000000 --targets 1000000 --workers 1 4 16
+# ============================================================
+
+def synthetic_points(n: int, id_col: str, seed: int) -> gpd.GeoDataFrame:
+    """Random lon/lat points over the Poland bounding box."""
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(14.1, 24.2, n)
+    y = rng.uniform(49.0, 54.9, n)
+    return gpd.GeoDataFrame({id_col: np.arange(n), "x": x, "y": y},
+                            geometry=gpd.points_from_xy(x, y), crs="EPSG:4326")
+
+
+def run_benchmark(n_boxes: int, n_targets: int, workers_list, mode: str = "haversine",
+                  max_bytes: int = DEFAULT_MAX_BYTES, repeat: int = 3):
+    """
+    Time nearest_target for each worker count and print the speed-up over workers=1.
+    The target tree (and the projected box coordinates) are built once up front, as
+    box2feature shares them across layers, so only the chunked, parallel query is timed.
+    Also checks that every parallel run returns exactly the serial result.
+    """
+    boxes = synthetic_points(n_boxes, "box_id", seed=0)
+    targets = synthetic_points(n_targets, "road_id", seed=1)
+    print(f"{n_boxes:,} boxes x {n_targets:,} targets, mode={mode}")
+
+    t0 = time.perf_counter()
+    if mode == "projected":
+        prebuilt = {"tree": cKDTree(project_xy(targets)), "main_xy": project_xy(boxes)}
+    else:
+        prebuilt = {"tree": build_sphere_tree(targets)}
+    print(f"index build (serial, not timed below) {time.perf_counter() - t0:8.2f} s")
+
+    baseline = None
+    reference = None
+    for workers in workers_list:
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            dist_km, idx = nearest_target(boxes, targets, mode=mode, max_bytes=max_bytes, workers=workers, **prebuilt)
+            timings.append(time.perf_counter() - t0)
+
+        if reference is None:
+            reference = (dist_km, idx)
+        elif not (np.array_equal(reference[0], dist_km) and np.array_equal(reference[1], idx)):
+            raise RuntimeError(f"workers={workers} result differs from workers={workers_list[0]}")
+
+        best = min(timings)
+        baseline = baseline or best
+        print(f"workers={workers:>3}  {best:8.2f} s  speed-up x{baseline / best:5.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel box -> target proximity scoring")
+    parser.add_argument("--boxes", type=int, default=1_000_000)
+    parser.add_argument("--targets", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--mode", choices=["haversine", "projected"], default="haversine")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.boxes, args.targets, args.workers, mode=args.mode, repeat=args.repeat)
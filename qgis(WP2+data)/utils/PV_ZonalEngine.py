@@ -0,0 +1,568 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+from contextlib import ExitStack
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pathlib import Path
+
+from utils.PV_ArtefactIO import read_artefact, write_artefact
+from utils.PV_GridBuilder import BoxGrid
+
+import rasterio
+from pyproj import Transformer
+from rasterio import features, windows
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.errors import WindowError
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform_bounds
+
+
+# ============================================================
+# Zonal statistics on a label array (QGIS-free replacement of PV_ZonalStatistic)
+# ============================================================
+
+EMPTY_WINDOW = windows.Window(0, 0, 0, 0)
+
+def raster_window(src, bounds) -> windows.Window:
+    """
+    Integer pixel window of src covering bounds (in the raster CRS), clipped to the raster.
+    EMPTY_WINDOW (0 x 0) when the bounds miss the raster, e.g. a regional raster and another region.
+    """
+    win = windows.from_bounds(*bounds, transform=src.transform)
+    col0, row0 = np.floor(win.col_off), np.floor(win.row_off)
+    col1, row1 = np.ceil(win.col_off + win.width), np.ceil(win.row_off + win.height)
+    win = windows.Window(int(col0), int(row0), int(col1 - col0), int(row1 - row0))
+    try:
+        return win.intersection(windows.Window(0, 0, src.width, src.height))
+    except WindowError:
+        return EMPTY_WINDOW
+
+def is_empty(win: windows.Window) -> bool:
+    return win.width <= 0 or win.height <= 0
+
+def label_array(geometries, transform, shape, index=None) -> np.ndarray:
+    """
+    Burn box positions into an int32 label array: label i + 1 for geometries[i],
+    0 for background. Pixels are assigned by their centre (same rule as native:zonalstatisticsfb).
+    index restricts the burn to those positions (labels stay i + 1).
+    """
+    positions = range(len(geometries)) if index is None else index
+    shapes = ((geometries[i], int(i) + 1) for i in positions
+              if geometries[i] is not None and not geometries[i].is_empty)
+    return features.rasterize(shapes, out_shape=shape, transform=transform, fill=0,
+                              all_touched=False, dtype="int32")
+
+def valid_mask(values: np.ndarray, nodata) -> np.ndarray:
+    """Pixels holding data: not nodata and not NaN."""
+    valid = ~np.isnan(values) if np.issubdtype(values.dtype, np.floating) else np.ones(values.shape, dtype=bool)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= values != nodata
+    return valid
+
+# ============================================================
+# Block streaming (bounded memory, same result as a full-window read)
+# ============================================================
+
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2  # working-memory budget of one strip (256 MB)
+_ZONAL_BYTES_PER_PIXEL = 32          # int32 label + band value + mask / gathered float64 temporaries
+_COVERAGE_BYTES_PER_PIXEL = 128      # (box, pixel, weight) triplets, edge pixels shared by several boxes
+_GRID_BYTES_PER_PIXEL = 96           # BoxGrid labels: pixel centres (+ reprojected copy) and row / col temporaries
+
+ZONAL_MODES = ("centre", "coverage")
+
+def strip_rows(src, width: int, band: int = 1, max_bytes: int = DEFAULT_MAX_BYTES,
+               bytes_per_pixel: int = _ZONAL_BYTES_PER_PIXEL) -> int:
+    """Strip height in rows: a multiple of the native block height that keeps one strip within max_bytes."""
+    block_h = src.block_shapes[band - 1][0]
+    rows = max_bytes // max(width * bytes_per_pixel, 1)
+    return max(block_h, rows // block_h * block_h)
+
+def strip_windows(win: windows.Window, rows: int):
+    """Full-width row strips of win, cut at multiples of rows so every read covers whole native blocks."""
+    start, end = int(win.row_off), int(win.row_off + win.height)
+    while start < end:
+        stop = min(end, (start // rows + 1) * rows)
+        yield windows.Window(win.col_off, start, win.width, stop - start)
+        start = stop
+
+def _carry_add(acc: np.ndarray, slots: np.ndarray, labels: np.ndarray, weights: np.ndarray):
+    """acc[slots] += per-label sums of weights, with the running totals added ahead of the new values."""
+    acc[slots] = np.bincount(np.concatenate([slots, labels]), weights=np.concatenate([acc[slots], weights]),
+                             minlength=len(acc))[slots]
+
+# ============================================================
+# Fractional pixel coverage (small boxes, coarse rasters)
+# ============================================================
+
+def is_rectangle(geometries) -> np.ndarray:
+    """Geometries that fill their own envelope, i.e. axis-aligned rectangles in their CRS."""
+    area = shapely.area(geometries)
+    return np.isclose(area, shapely.area(shapely.envelope(geometries)), rtol=1e-9, atol=0) & (area > 0)
+
+def pixel_coverage(geometries, index: np.ndarray, transform, shape, rectangle: np.ndarray):
+    """
+    Covered fraction of every pixel under each box, as sparse triplets.
+
+    Candidate pixels come from the box envelope. For axis-aligned rectangles the
+    overlap is the product of the x and y interval overlaps with the pixel edges
+    (no geometry op); any other box (reprojected grid, hex cells) falls back to
+    vectorised shapely intersection areas with the candidate pixel squares.
+
+    Args:
+        index: positions in geometries to evaluate
+        transform: north-up transform of the window, shape: (height, width)
+        rectangle: is_rectangle(geometries)
+
+    Returns:
+        (position, pixel, weight): box position in geometries, flat pixel index in
+        the window, fraction of that pixel covered by the box (0 < weight <= 1)
+    """
+    if transform.b or transform.d:
+        raise ValueError("Coverage weights need a north-up raster (no rotation terms)")
+    height, width = shape
+    a, x0, e, y0 = transform.a, transform.c, transform.e, transform.f
+    minx, miny, maxx, maxy = shapely.bounds(geometries[index]).T
+
+    c0 = np.clip(np.floor((minx - x0) / a), 0, width).astype(np.int64)
+    c1 = np.clip(np.ceil((maxx - x0) / a), 0, width).astype(np.int64)
+    r0 = np.clip(np.floor((maxy - y0) / e), 0, height).astype(np.int64)
+    r1 = np.clip(np.ceil((miny - y0) / e), 0, height).astype(np.int64)
+    ncol, nrow = np.maximum(c1 - c0, 0), np.maximum(r1 - r0, 0)
+    npix = ncol * nrow
+
+    k = np.repeat(np.arange(len(index)), npix)
+    j = np.arange(npix.sum()) - np.repeat(np.cumsum(npix) - npix, npix)
+    col = c0[k] + j % ncol[k]
+    row = r0[k] + j // ncol[k]
+    left, top = x0 + col * a, y0 + row * e
+    right, bottom = left + a, top + e
+
+    pixel_area = abs(a * e)
+    ox = np.minimum(maxx[k], right) - np.maximum(minx[k], left)
+    oy = np.minimum(maxy[k], top) - np.maximum(miny[k], bottom)
+    weight = np.clip(ox, 0, None) * np.clip(oy, 0, None) / pixel_area
+
+    other = ~rectangle[index][k]
+    if other.any():
+        cells = shapely.box(left[other], bottom[other], right[other], top[other])
+        weight[other] = shapely.area(shapely.intersection(geometries[index][k[other]], cells)) / pixel_area
+
+    keep = weight > 0
+    return index[k[keep]], (row * width + col)[keep], np.minimum(weight[keep], 1.0)
+
+# ============================================================
+# Streaming accumulation
+# ============================================================
+
+def _check_mode(mode: str):
+    if mode not in ZONAL_MODES:
+        raise ValueError(f"Unknown zonal mode {mode!r}, expected one of {ZONAL_MODES}")
+
+def _strip_pixels(geometries, hits: np.ndarray, ref, strip: windows.Window, rectangle: Optional[np.ndarray]):
+    """
+    (position, pixel, weight) of the boxes hits inside one strip: box position, flat
+    pixel index in the strip and coverage weight (None in centre mode, where every
+    pixel belongs to exactly one box with weight 1).
+    """
+    transform, shape = ref.window_transform(strip), (int(strip.height), int(strip.width))
+    if rectangle is not None:
+        return pixel_coverage(geometries, hits, transform, shape, rectangle)
+    labels = label_array(geometries, transform, shape, index=hits)
+    pixel = np.flatnonzero(labels)
+    return labels.ravel()[pixel].astype(np.int64) - 1, pixel, None
+
+def _grid_strip_pixels(grid: BoxGrid, ref, strip: windows.Window, to_grid: Optional[Transformer]):
+    """(position, pixel) of one strip from the BoxGrid: pixel centres -> grid CRS -> row / col (centre rule)."""
+    transform = ref.window_transform(strip)
+    cols, rows = np.meshgrid(np.arange(int(strip.width)) + 0.5, np.arange(int(strip.height)) + 0.5)
+    x, y = transform * (cols.ravel(), rows.ravel())
+    if to_grid is not None:
+        x, y = to_grid.transform(x, y)
+    position = grid.label_points(x, y)
+    pixel = np.flatnonzero(position >= 0)
+    return position[pixel], pixel
+
+def _strip_height(cells, ref, win: windows.Window, band: int, max_bytes: int, mode: str) -> int:
+    """Rows per strip of _strips for these cells and mode within max_bytes."""
+    if isinstance(cells, BoxGrid):
+        bytes_per_pixel = _GRID_BYTES_PER_PIXEL
+    else:
+        bytes_per_pixel = _COVERAGE_BYTES_PER_PIXEL if mode == "coverage" else _ZONAL_BYTES_PER_PIXEL
+    return strip_rows(ref, int(win.width), band, max_bytes, bytes_per_pixel)
+
+def _strips(cells, ref, win: windows.Window, band: int, max_bytes: int, mode: str):
+    """
+    (strip, hits, position, pixel, weight) for every strip of win holding boxes.
+
+    cells is a BoxGrid (centre mode: labels from row / col arithmetic, no
+    rasterisation) or an array of box geometries in the CRS of ref (each strip
+    rasterises only the boxes whose envelope reaches it, STRtree query). hits
+    are the sorted positions of the boxes the strip may touch.
+    """
+    rows = _strip_height(cells, ref, win, band, max_bytes, mode)
+    if isinstance(cells, BoxGrid):
+        same_crs = CRS.from_user_input(cells.crs) == ref.crs
+        to_grid = None if same_crs else Transformer.from_crs(ref.crs, cells.crs, always_xy=True)
+        for strip in strip_windows(win, rows):
+            position, pixel = _grid_strip_pixels(cells, ref, strip, to_grid)
+            if position.size:
+                yield strip, np.unique(position), position, pixel, None
+        return
+
+    tree = shapely.STRtree(cells)
+    rectangle = is_rectangle(cells) if mode == "coverage" else None
+    for strip in strip_windows(win, rows):
+        hits = np.sort(tree.query(shapely.box(*windows.bounds(strip, ref.transform))))
+        if hits.size:
+            yield (strip, hits, *_strip_pixels(cells, hits, ref, strip, rectangle))
+
+def zonal_accumulate(geometries, readers: dict, ref, win: windows.Window, band: int = 1,
+                     max_bytes: int = DEFAULT_MAX_BYTES, mode: str = "centre", strips=None) -> dict:
+    """
+    Per-box pixel count and sum of every reader over win, streamed strip by strip.
+
+    Each strip rasterises only the boxes whose envelope reaches it (STRtree query),
+    so peak memory is one strip of labels plus one strip of values, independent of
+    the raster size. The running sum of a box is fed into the strip's bincount ahead
+    of its pixels, so values are added in the same order as one bincount over the
+    whole window: counts and sums are bit-identical to a full load.
+
+    mode:
+        'centre'   - a pixel belongs to the box holding its centre (native:zonalstatisticsfb rule)
+        'coverage' - every pixel touching a box counts with the fraction of it the box covers,
+                     so boxes smaller than a pixel still get a value; count is then the covered
+                     area in pixels and the mean is coverage-weighted
+
+    Args:
+        geometries: box geometries in the CRS of ref, or a BoxGrid (centre mode only,
+                    labels from row / col instead of rasterised polygons)
+        readers: {name: (dataset on the pixel grid of ref, nodata)}
+        ref: dataset defining the pixel grid (transform, native blocks)
+        strips: the labelled strips to use instead of building them (see cached_strips)
+
+    Returns:
+        {name: (count, sum)}, arrays aligned with geometries
+    """
+    _check_mode(mode)
+    if strips is None:
+        strips = _strips(geometries, ref, win, band, max_bytes, mode)
+    coverage = mode == "coverage"
+    n = len(geometries)
+    count_dtype = np.float64 if coverage else np.int64
+    acc = {name: (np.zeros(n + 1, dtype=count_dtype), np.zeros(n + 1, dtype=np.float64)) for name in readers}
+
+    for strip, hits, position, pixel, weight in strips:
+        lab, slots = position + 1, hits + 1
+
+        for name, (reader, nodata) in readers.items():
+            values = reader.read(band, window=strip).ravel()[pixel]
+            valid = valid_mask(values, nodata)
+            count, total = acc[name]
+            # running totals first, then this strip's pixels in row-major order
+            if coverage:
+                w = weight[valid]
+                _carry_add(count, slots, lab[valid], w)
+                _carry_add(total, slots, lab[valid], w * values[valid].astype(np.float64))
+            else:
+                count += np.bincount(lab[valid], minlength=n + 1)
+                _carry_add(total, slots, lab[valid], values[valid].astype(np.float64))
+
+    return {name: (count[1:], total[1:]) for name, (count, total) in acc.items()}
+
+# ============================================================
+# Persisted pixel labels / weights (same grid + raster grid -> reuse)
+# ============================================================
+
+# The box x pixel weight matrix W is stored in row strips of pixels: each strip is
+# a COO block of W (box position, pixel offset, weight) and is applied as
+# bincount(position, weight * value), i.e. the strip's share of W @ value. This is
+# used instead of one CSR / CSC matrix over the whole window: that matrix needs
+# all triplets and one indptr entry per pixel in memory at once (several GB for a
+# national DEM), while a strip is bounded by max_bytes like the uncached pass,
+# and the bincount keeps the results bit-identical to it (a sparse mat-vec sums
+# in another order).
+
+WEIGHT_CACHE_VERSION = 2  # bump when the strip layout or the pixel rules change
+WEIGHT_CACHE_GRACE_S = 3600  # stale entries used within this many seconds are kept (another run may be reading them)
+
+def weights_key(geometries, ref, win: windows.Window, mode: str, rows: int = 0) -> str:
+    """
+    sha256 of everything the weights depend on: the boxes, the reference pixel grid
+    (CRS, transform, size), the window, the mode and the strip height (not pixel values).
+
+    Any change of the grid (cell lattice, kept cells, clipped boundary cells or any
+    polygon vertex) or of the reference pixel grid gives another key, so a stale
+    entry is never read; rasters that differ only in their values share the key.
+    """
+    h = hashlib.sha256()
+    h.update(f"v{WEIGHT_CACHE_VERSION}|{mode}|{ref.crs.to_wkt()}|{tuple(ref.transform)}|"
+             f"{ref.width}x{ref.height}|{win.col_off},{win.row_off},{win.width},{win.height}|{rows}".encode())
+    if isinstance(geometries, BoxGrid):
+        h.update(f"|grid|{geometries.crs}|{geometries.origin_x},{geometries.origin_y},{geometries.h_space},"
+                 f"{geometries.v_space},{geometries.n_rows}x{geometries.n_cols}|".encode())
+        h.update(geometries.row.tobytes() + geometries.col.tobytes())
+        geometries = geometries.edge_geoms if geometries.edge_geoms is not None else []
+    for wkb in shapely.to_wkb(geometries):
+        h.update(wkb or b"")
+        h.update(b"|")
+    return h.hexdigest()
+
+def _evict_weights(cache_dir: Path, source: str, keep: Path):
+    """
+    Remove stale weight entries: exactly zonal_weights-v<n>-<hash16> (older versions
+    and their single-file .npz matrices included), built for the same source, and
+    not used for WEIGHT_CACHE_GRACE_S.
+    """
+    pattern = re.compile(r"zonal_weights-v\d+-[0-9a-f]{16}(\.npz)?")
+    now = time.time()
+    for old in cache_dir.iterdir():
+        if old == keep or not pattern.fullmatch(old.name):
+            continue
+        try:
+            if old.is_file():
+                # v1 matrix: one file for the whole window, no source marker
+                if now - old.stat().st_mtime >= WEIGHT_CACHE_GRACE_S:
+                    old.unlink()
+                continue
+            marker = old / "source.txt"
+            if marker.read_text() != source or now - marker.stat().st_mtime < WEIGHT_CACHE_GRACE_S:
+                continue
+            shutil.rmtree(old)
+        except FileNotFoundError:  # unmarked entry, or another run removed it first
+            continue
+
+def cached_strips(geometries, ref, win: windows.Window, cache_dir, band: int = 1,
+                  max_bytes: int = DEFAULT_MAX_BYTES, mode: str = "centre", source: Optional[str] = None):
+    """
+    _strips, persisted strip by strip in cache_dir/zonal_weights-v<version>-<key[:16]>/.
+
+    Each strip is one strip-<row offset>.npz holding its hits, positions, pixel
+    offsets and (coverage mode) weights, i.e. its slice of the box x pixel weight
+    matrix. The first run writes the strips while it accumulates them, later runs
+    read them back one at a time, so peak memory stays at one strip either way.
+
+    Reused by: every raster read on the reference pixel grid of the entry, i.e.
+    all bands of a zonal_stats_multi stack (rasters on other grids are warped
+    onto the reference), later runs on the same grid after the raster values
+    were refreshed, and other regions' runs only if their grid is identical.
+    Not reused (new key, see weights_key) when the grid, the reference pixel
+    grid, the window, the mode or the strip height (max_bytes) changes.
+    Entries of the same source (e.g. grid + raster path) that no run has used
+    for WEIGHT_CACHE_GRACE_S are removed once a new one is complete.
+    """
+    cache_dir = Path(cache_dir)
+    rows = _strip_height(geometries, ref, win, band, max_bytes, mode)
+    entry = cache_dir / f"zonal_weights-v{WEIGHT_CACHE_VERSION}-{weights_key(geometries, ref, win, mode, rows)[:16]}"
+    marker = entry / "source.txt"
+
+    if marker.exists():
+        marker.write_text(source or "")  # last use, read by _evict_weights
+        for path in sorted(entry.glob("strip-*.npz")):
+            with np.load(path) as z:
+                weight = z["weight"] if "weight" in z.files else None
+                yield (windows.Window(*z["window"]), z["hits"], z["position"], z["pixel"], weight)
+        return
+
+    tmp = cache_dir / f"{entry.name}.tmp{os.getpid()}"
+    tmp.mkdir(parents=True, exist_ok=True)
+    try:
+        for strip, hits, position, pixel, weight in _strips(geometries, ref, win, band, max_bytes, mode):
+            arrays = {"window": np.array([strip.col_off, strip.row_off, strip.width, strip.height], dtype=np.int64),
+                      "hits": hits, "position": position.astype(np.int32), "pixel": pixel.astype(np.int32)}
+            if weight is not None:
+                arrays["weight"] = weight
+            np.savez(tmp / f"strip-{int(strip.row_off):09d}.npz", **arrays)
+            yield strip, hits, position, pixel, weight
+        # the marker last: an entry without it is incomplete and never read
+        (tmp / "source.txt").write_text(source or "")
+        try:
+            os.replace(tmp, entry)
+        except OSError:  # another run completed the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if source is not None:
+        _evict_weights(cache_dir, source, entry)
+
+def _zonal_pass(geometries, readers: dict, ref, win: windows.Window, band: int, max_bytes: int, mode: str,
+                cache_dir, cache_source: Optional[str]) -> dict:
+    strips = None
+    if cache_dir is not None:
+        source = None if cache_source is None else f"{cache_source}|{ref.name}|{mode}"
+        strips = cached_strips(geometries, ref, win, cache_dir, band, max_bytes, mode, source)
+    return zonal_accumulate(geometries, readers, ref, win, band, max_bytes, mode, strips=strips)
+
+def _box_ids(grid) -> np.ndarray:
+    return grid.box_id if isinstance(grid, BoxGrid) else grid["box_id"].to_numpy()
+
+def _grid_bounds(grid):
+    """(crs, (minx, miny, maxx, maxy)) of the whole grid in its own CRS, without reprojecting any box."""
+    if isinstance(grid, BoxGrid):
+        minx, miny, maxx, maxy = grid.bounds()
+        return grid.crs, (minx.min(), miny.min(), maxx.max(), maxy.max())
+    return grid.crs, tuple(grid.total_bounds)
+
+def _cells(grid, crs, mode: str):
+    """
+    (cells, bounds) of the grid for a raster in crs: a BoxGrid stays as is in centre
+    mode (labels from row / col), anything else becomes box polygons in crs.
+    """
+    if isinstance(grid, BoxGrid):
+        if mode == "centre":
+            grid_crs, bounds = _grid_bounds(grid)
+            return grid, transform_bounds(grid_crs, crs, *bounds, densify_pts=21)
+        geoms = gpd.GeoSeries(grid.polygons(), crs=grid.crs).to_crs(crs)
+    else:
+        geoms = grid.geometry.to_crs(crs)
+    return geoms.to_numpy(), geoms.total_bounds
+
+def _read_grid(vector_path):
+    """BoxGrid from a .npz, otherwise the box_id + geometry columns of the polygon artefact (hex grids, older runs)."""
+    if Path(vector_path).suffix == ".npz":
+        return BoxGrid.load(vector_path)
+    return read_artefact(vector_path, columns=["box_id", "geometry"])
+
+def _no_overlap(n: int, mode: str):
+    """(count, sum) of a raster that does not reach the grid: count 0, sum NaN (not 0: nothing was read)."""
+    return np.zeros(n, dtype=np.float64 if mode == "coverage" else np.int64), np.full(n, np.nan)
+
+def _stats_frame(grid, acc: dict) -> pd.DataFrame:
+    out = pd.DataFrame({"box_id": _box_ids(grid)})
+    for name, (count, total) in acc.items():
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[f"{name}_count"] = count
+            out[f"{name}_sum"] = total
+            out[f"{name}_mean"] = np.where(count > 0, total / count, np.nan)
+    return out
+
+def zonal_stats(grid_gdf, raster_path, band: int = 1, max_bytes: int = DEFAULT_MAX_BYTES, mode: str = "centre",
+                cache_dir=None, cache_source: Optional[str] = None) -> pd.DataFrame:
+    """
+    Per-box count / sum / mean of one raster band.
+
+    The grid is reprojected to the raster CRS and the raster window under the grid
+    is streamed in strips of native blocks (no clipped copy of the raster, no
+    full-window read); every statistic comes from bincount passes over the strips.
+    With cache_dir the labelled strips are read back (or built once and saved, see
+    cached_strips); cache_source (e.g. the grid path) scopes the eviction of older
+    entries. grid_gdf may be a BoxGrid: in
+    centre mode its pixel labels then come from row / col arithmetic on the pixel
+    centres, without polygons or rasterisation.
+
+    Returns:
+        DataFrame aligned with grid_gdf: box_id, _count, _sum, _mean (NaN where no valid pixel
+        is assigned to the box; see zonal_accumulate for the 'centre' / 'coverage' modes).
+        A raster that does not overlap the grid gives count 0 and NaN sum / mean everywhere.
+    """
+    with rasterio.open(raster_path) as src:
+        grid_crs, grid_bounds = _grid_bounds(grid_gdf)
+        if is_empty(_grid_window(src, grid_crs, grid_bounds)):
+            print(f"Warning: raster {raster_path} does not overlap the grid")
+            return _stats_frame(grid_gdf, {"": _no_overlap(len(grid_gdf), mode)})
+        cells, bounds = _cells(grid_gdf, src.crs, mode)
+        win = raster_window(src, bounds)
+        acc = _zonal_pass(cells, {"": (src, src.nodata)}, src, win, band, max_bytes, mode, cache_dir, cache_source)
+    return _stats_frame(grid_gdf, acc)
+
+# ============================================================
+# Multi-raster zonal statistics (one label array per strip, one traversal)
+# ============================================================
+
+def _grid_window(src, grid_crs, bounds) -> windows.Window:
+    """Window of src under the grid bounds (grid CRS), for choosing the reference raster only."""
+    return raster_window(src, transform_bounds(grid_crs, src.crs, *bounds, densify_pts=21))
+
+def _same_pixel_grid(src, ref) -> bool:
+    return src.crs == ref.crs and src.transform == ref.transform and (src.width, src.height) == (ref.width, ref.height)
+
+def zonal_stats_multi(grid_gdf, rasters: dict, band: int = 1, max_bytes: int = DEFAULT_MAX_BYTES, mode: str = "centre",
+                      cache_dir=None, cache_source: Optional[str] = None) -> pd.DataFrame:
+    """
+    count / sum / mean of several rasters per box in one traversal.
+
+    The finest raster under the grid (most pixels in the grid window) is the
+    reference pixel grid. Rasters that do not overlap the grid are never the
+    reference and get count 0 and NaN sum / mean. Rasters on another grid are read through a WarpedVRT
+    aligned to it (nearest neighbour, so values are repeated, never blended).
+    The window is streamed in strips of the reference's native blocks, and every
+    band of the stack reuses the label array of each strip (or, with cache_dir,
+    the persisted strips of the reference pixel grid).
+
+    Args:
+        grid_gdf: box_id + geometry layer, or a BoxGrid (see zonal_stats)
+        rasters: {name: raster path}, e.g. {'dni': ..., 'pvout': ..., 'temp': ..., 'dem': ...}
+
+    Returns:
+        DataFrame aligned with grid_gdf: box_id, {name}_count, {name}_sum, {name}_mean per raster
+    """
+    with ExitStack() as stack:
+        sources = {name: stack.enter_context(rasterio.open(path)) for name, path in rasters.items()}
+        # reference choice from the grid bounds mapped into each raster CRS; the grid itself
+        # is reprojected / materialised once, for the reference CRS only
+        grid_crs, grid_bounds = _grid_bounds(grid_gdf)
+        pixels = {name: _grid_window(src, grid_crs, grid_bounds) for name, src in sources.items()}
+        missed = [name for name, win in pixels.items() if is_empty(win)]
+        for name in missed:
+            print(f"Warning: raster '{name}' does not overlap the grid")
+        overlapping = {name: src for name, src in sources.items() if name not in missed}
+        empty = _no_overlap(len(grid_gdf), mode)
+        if not overlapping:
+            return _stats_frame(grid_gdf, {name: empty for name in rasters})
+        ref = overlapping[max(overlapping, key=lambda name: pixels[name].width * pixels[name].height)]
+        cells, bounds = _cells(grid_gdf, ref.crs, mode)
+        win = raster_window(ref, bounds)
+
+        readers = {}
+        for name, src in overlapping.items():
+            nodata = src.nodata
+            if _same_pixel_grid(src, ref):
+                readers[name] = (src, nodata)
+                continue
+            # pixels outside the source must come back as nodata, not 0
+            if nodata is None and np.issubdtype(np.dtype(src.dtypes[band - 1]), np.floating):
+                nodata = np.nan
+            vrt_kwargs = {} if nodata is None else {"nodata": nodata}
+            vrt = stack.enter_context(WarpedVRT(src, crs=ref.crs, transform=ref.transform, width=ref.width,
+                                                height=ref.height, resampling=Resampling.nearest, **vrt_kwargs))
+            readers[name] = (vrt, nodata)
+
+        acc = _zonal_pass(cells, readers, ref, win, band, max_bytes, mode, cache_dir, cache_source)
+    return _stats_frame(grid_gdf, {name: acc.get(name, empty) for name in rasters})
+
+def runner_PvZonalStatisticMulti(vector_path, rasters: dict, output_path, max_bytes: int = DEFAULT_MAX_BYTES,
+                                 mode: str = "centre", cache_dir=None):
+    """
+    One zonal table (no geometry, format from the suffix) for all rasters: box_id + {name}_count/_sum/_mean.
+    vector_path is the BoxGrid .npz (labels from row / col) or the polygon grid artefact.
+    Rasters whose file is missing are skipped with a warning. cache_dir (opt-in) persists
+    the labelled strips for the next run, see cached_strips.
+    """
+    present = {}
+    for name, path in rasters.items():
+        if Path(path).exists():
+            present[name] = path
+        else:
+            print(f"Warning: File missing for raster '{name}' -> {path}")
+    if not present:
+        raise FileNotFoundError("No zonal raster found")
+    stats = zonal_stats_multi(_read_grid(vector_path), present, max_bytes=max_bytes, mode=mode, cache_dir=cache_dir,
+                              cache_source=str(Path(vector_path).resolve()))
+    write_artefact(stats, output_path)
+    print(f"calculated zonal statistics {list(present)} Done -> {output_path}")
+
+def runner_PvZonalStatistic(vector_path, raster_path, output_path, max_bytes: int = DEFAULT_MAX_BYTES,
+                            mode: str = "centre", cache_dir=None):
+    """Narrow table of one raster: box_id, _count, _sum, _mean (column names of the former QGIS model output)."""
+    stats = zonal_stats(_read_grid(vector_path), raster_path, max_bytes=max_bytes, mode=mode, cache_dir=cache_dir,
+                        cache_source=str(Path(vector_path).resolve()))
+    write_artefact(stats, output_path)
+    print(f"calculated zonal statistic Done -> {output_path}")
@@ -3,10 +3,15 @@ import pandas as pd
 import numpy as np
 from pymcdm.methods import TOPSIS
 
+from utils.PV_ArtefactIO import read_artefact
+
 def mcdm_score_calculation(input_path):
     # 1. LOAD GEOJSON DATA
-    gdf = gpd.read_file(input_path)
-    
+    gdf = read_artefact(input_path)
+    return mcdm_score_frame(gdf)
+
+def mcdm_score_frame(gdf):
+    """CRITIC weights + TOPSIS on an already loaded final-score table (box_id must be unique)."""
     # 2. Define Criteria
     criteria = [
         'dni_score', 'temp_score', 'pvout_score', 'dem_score', 